@@ -1,18 +1,81 @@
+import importlib
+from typing import TYPE_CHECKING
+
 from .base import CfgBase, ConfigurationBase, GraphBase, SearchQuery, Queries
 from .enums import LlmServers, ModelNames, NodeBase, TavilySearchCategory, TavilySearchDepth
-from .engine import Engine
-from .llm import load_ollama_model, get_llm, get_model_name_alias
-from .price import calculate_token_cost
-from .utils import (
-    get_config_from_runnable,
-    get_flow_chart,
-    tavily_search_async,
-    deduplicate_and_format_sources,
-    deduplicate_sources,
-    format_sources,
-    strip_thinking_tokens,
-)
-from .web_search import WebSearch
+
+if TYPE_CHECKING:
+    from .cache import DiskCache
+    from .engine import Engine
+    from .llm import close_cached_llms, load_ollama_model, get_llm, get_model_name_alias
+    from .price import calculate_token_cost
+    from .utils import (
+        canonicalize_url,
+        compile_prompt,
+        get_config_from_runnable,
+        get_flow_chart,
+        get_token_usage,
+        run_sync,
+        tavily_search_async,
+        tavily_search_as_completed,
+        deduplicate_and_format_sources,
+        deduplicate_sources,
+        deduplicate_sources_async,
+        format_sources,
+        freeze_today,
+        strip_thinking_tokens,
+        today_iso,
+        unique_urls,
+        update_token_usage,
+    )
+    from .web_search import WebSearch
+
+
+# Heavy submodules (langchain providers, tavily, PIL) are imported on first attribute access (PEP 562)
+_LAZY_ATTRIBUTES = {
+    'DiskCache': '.cache',
+    'Engine': '.engine',
+    'WebSearch': '.web_search',
+    'calculate_token_cost': '.price',
+    'tavily_search_async': '.utils',
+    'tavily_search_as_completed': '.utils',
+    'load_ollama_model': '.llm',
+    'get_llm': '.llm',
+    'get_model_name_alias': '.llm',
+    'close_cached_llms': '.llm',
+    'get_flow_chart': '.utils',
+    'compile_prompt': '.utils',
+    'canonicalize_url': '.utils',
+    'deduplicate_and_format_sources': '.utils',
+    'deduplicate_sources': '.utils',
+    'deduplicate_sources_async': '.utils',
+    'unique_urls': '.utils',
+    'format_sources': '.utils',
+    'strip_thinking_tokens': '.utils',
+    'get_config_from_runnable': '.utils',
+    'update_token_usage': '.utils',
+    'get_token_usage': '.utils',
+    'today_iso': '.utils',
+    'freeze_today': '.utils',
+    'run_sync': '.utils',
+}
+_LAZY_SUBMODULES = ('base', 'tools', 'utils')
+
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(_LAZY_ATTRIBUTES[name], __name__)
+        value = getattr(module, name)
+    elif name in _LAZY_SUBMODULES:
+        value = importlib.import_module(f'.{name}', __name__)
+    else:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(__all__) | set(_LAZY_SUBMODULES))
 
 
 __all__ = [
@@ -26,17 +89,29 @@ __all__ = [
     'Queries',
     'LlmServers',
     'ModelNames',
+    'DiskCache',
     'Engine',
     'WebSearch',
     'calculate_token_cost',
     'tavily_search_async',
+    'tavily_search_as_completed',
     'load_ollama_model',
     'get_llm',
     'get_model_name_alias',
+    'close_cached_llms',
     'get_flow_chart',
+    'compile_prompt',
+    'canonicalize_url',
     'deduplicate_and_format_sources',
     'deduplicate_sources',
+    'deduplicate_sources_async',
+    'unique_urls',
     'format_sources',
     'strip_thinking_tokens',
     'get_config_from_runnable',
+    'update_token_usage',
+    'get_token_usage',
+    'today_iso',
+    'freeze_today',
+    'run_sync',
 ]
@@ -1,10 +1,34 @@
+from __future__ import annotations
+
 import os
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, fields
-from typing import Any, Optional, TypeAlias, Literal
+from functools import lru_cache
+from typing import Any, Optional, TypeAlias, Literal, TYPE_CHECKING
+
+from pydantic import BaseModel, ConfigDict, Field
+
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableConfig
+
+
+@lru_cache(maxsize=None)
+def _required_fields(cls: type[BaseModel]) -> tuple[str, ...]:
+    # Building the JSON schema is expensive; it only depends on the class
+    return tuple(cls.model_json_schema()['required'])
+
 
-from pydantic import BaseModel, Field
-from langchain_core.runnables import RunnableConfig
+@lru_cache(maxsize=None)
+def _init_fields(cls: type) -> tuple[tuple[str, str], ...]:
+    # (field name, environment variable name) pairs of the dataclass init fields
+    return tuple((f.name, f.name.upper()) for f in fields(cls) if f.init)
+
+
+@lru_cache(maxsize=256)
+def _cfg_from_values(cls: type[CfgBase], values: tuple[tuple[str, type, Any], ...]) -> CfgBase:
+    # Nodes of a graph run build the same configuration from the same config; validate it only once. The value types
+    # are part of the key, since equal values of different types (e.g. 1, 1.0 and True) may validate differently.
+    return cls(**{name: value for name, _, value in values})
 
 
 class CfgBase(BaseModel):
@@ -12,10 +36,17 @@ class CfgBase(BaseModel):
 
     @classmethod
     def from_runnable(cls, runnable: RunnableConfig):
-        required_fields = cls.model_json_schema()['required']
-        cfg = {f: runnable["configurable"][f] for f in required_fields}
-        configurable = cls(**cfg)
-        return configurable
+        """
+        Create a configuration from the required fields of runnable["configurable"].
+
+        Validated configurations are cached on the values of those fields; every caller gets a copy of its own.
+        """
+        configurable = runnable["configurable"]
+        cfg = tuple((f, type(configurable[f]), configurable[f]) for f in _required_fields(cls))
+        try:
+            return _cfg_from_values(cls, cfg).model_copy()
+        except TypeError:  # Unhashable values (e.g. lists) cannot be cached
+            return cls(**{name: value for name, _, value in cfg})
 
 
 @dataclass(kw_only=True)
@@ -32,12 +63,13 @@ class ConfigurationBase:
         configurable = (
             config["configurable"] if config and "configurable" in config else {}
         )
-        values: dict[str, Any] = {
-            f.name: os.environ.get(f.name.upper(), configurable.get(f.name))
-            for f in fields(cls)
-            if f.init
-        }
-        return cls(**{k: v for k, v in values.items() if v})
+        environ = os.environ
+        values: dict[str, Any] = {}
+        for name, env_name in _init_fields(cls):
+            value = environ.get(env_name, configurable.get(name))
+            if value:
+                values[name] = value
+        return cls(**values)
 
 
 
@@ -79,10 +111,14 @@ class SearchQuery(BaseModel):
                                  and what information it's expected to retrieve. Defaults to None.
 
     """
+    model_config = ConfigDict(frozen=True)
+
     search_query: str = Field(description="Query for web search.")
     aspect: str = Field(None, description="Which aspect of the topic the query aims to cover.")
     rationale: str = Field(None, description="Reasoning for generating the search query.")
 
 
 class Queries(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     queries: list[SearchQuery]
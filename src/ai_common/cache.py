@@ -0,0 +1,68 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Any
+
+
+class DiskCache:
+    """
+    Persistent key-value cache backed by an SQLite database (standard library only).
+
+    Values must be JSON serializable. Keys are usually built with make_key from everything the cached value
+    depends on, so that any change of inputs results in a cache miss instead of a stale value.
+    get and set block on SQLite (and on JSON encoding, which takes milliseconds for large values such as search
+    responses), so async code uses aget and aset, which run them in a worker thread.
+
+    Example:
+        >>> cache = DiskCache(path='.ai_common_cache.db')
+        >>> key = DiskCache.make_key('gpt-5', 'topic', 'content')
+        >>> cache.set(key, 'summary')
+        >>> cache.get(key)
+        'summary'
+    """
+    def __init__(self, path: str | os.PathLike, table: str = 'cache'):
+        if not table.isidentifier():
+            raise ValueError(f'Invalid table name: {table}')
+        self.table = table
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        # In WAL mode, this only gives up durability of the last writes on power loss, not consistency, and spares
+        # a sync of the file on every write
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(f'CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            digest.update(part.encode())
+            digest.update(b'\x1f')  # Separator, so that ('ab', 'c') and ('a', 'bc') differ
+        return digest.hexdigest()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._connection.execute(f'SELECT value FROM {self.table} WHERE key = ?', (key,)).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._connection.execute(f'INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)',
+                                     (key, json.dumps(value)))
+
+    async def aget(self, key: str, default: Any = None) -> Any:
+        return await asyncio.to_thread(self.get, key, default)
+
+    async def aset(self, key: str, value: Any) -> None:
+        await asyncio.to_thread(self.set, key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute(f'DELETE FROM {self.table}')
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -1,29 +1,36 @@
 import asyncio
-import datetime
-import json
-from typing import Any, Final
+from typing import Any, AsyncIterator, Final, Protocol, TypeVar
 
-from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables import Runnable, RunnableConfig
 from langchain_core.callbacks import get_usage_metadata_callback
-from pydantic import BaseModel
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from pydantic import BaseModel, SecretStr
+from pydantic_core import from_json
 
-from ai_common import get_config_from_runnable, get_llm, NodeBase, SearchQuery
+from ai_common import (
+    compile_prompt,
+    get_config_from_runnable,
+    get_llm,
+    get_model_name_alias,
+    get_token_usage,
+    LlmServers,
+    ModelNames,
+    NodeBase,
+    Queries,
+    SearchQuery,
+    run_sync,
+    today_iso,
+    update_token_usage,
+)
 
-QUERY_WRITER_INSTRUCTIONS = """
+# The system prompts are static, so they form an identical prefix on every call that providers can serve from their
+# prompt caches. Everything that varies per call goes into the (short) human message.
+QUERY_WRITER_SYSTEM_PROMPT = """
 <Goal>
 Your goal is to generate targeted web search queries that will gather comprehensive information for writing a summary about a topic.
-You will generate exactly {number_of_queries} queries.
+You will generate exactly the requested number of queries.
 </Goal>
 
-<topic>
-{topic}
-</topic>
-
-Today's date is:
-<today>
-{today}
-</today>
-
 <Requirements>
 When generating the search queries:
 1. Make sure to cover different aspects of the topic.
@@ -44,16 +51,27 @@ Your queries should be:
     - rationale: Your reasoning.    
 
 Return the queries in JSON format:
-{{
+{
     queries: [
-            {{
+            {
                 "search_query": "string",
                 "aspect": "string",
                 "rationale": "string"
-            }}
+            }
     ]
-}}
+}
 </Format>
+"""
+
+QUERY_WRITER_USER_PROMPT = """
+<topic>
+{topic}
+</topic>
+
+Today's date is:
+<today>
+{today}
+</today>
 
 <Task>
 It is very important that you generate exactly {number_of_queries} queries.
@@ -61,58 +79,286 @@ Generate targeted web search queries that will gather specific information about
 </Task>
 """
 
+QUERY_WRITER_BATCH_SYSTEM_PROMPT = """
+<Goal>
+Your goal is to generate targeted web search queries that will gather comprehensive information for writing a summary about each of the given topics.
+You will generate exactly the requested number of queries for each topic.
+</Goal>
+
+<Requirements>
+When generating the search queries:
+1. Make sure to cover different aspects of each topic.
+2. Make sure that your queries account for the most current information available as of today.
+
+Your queries should be:
+- Specific enough to avoid generic or irrelevant results.
+- Targeted to gather specific information about their topic.
+- Diverse enough to cover all aspects of the summary plan.
+</Requirements>
+
+<Format>
+* Format your response as a JSON object with one field:
+    - groups: One entry per topic, in the same order as the topics are given.
+* Each entry should have one field:
+    - queries: Queries you generate according to that topic.
+* Each query should have the following three fields:
+    - search_query: Text of the query.
+    - aspect: Which aspect of the topic the query aims to cover.
+    - rationale: Your reasoning.
+
+Return the queries in JSON format:
+{
+    groups: [
+        {
+            queries: [
+                    {
+                        "search_query": "string",
+                        "aspect": "string",
+                        "rationale": "string"
+                    }
+            ]
+        }
+    ]
+}
+</Format>
+"""
+
+QUERY_WRITER_BATCH_USER_PROMPT = """
+<topics>
+{topics}
+</topics>
+
+Today's date is:
+<today>
+{today}
+</today>
+
+<Task>
+It is very important that you return exactly {number_of_topics} groups with exactly {number_of_queries} queries each.
+Generate targeted web search queries that will gather specific information about the given topics.
+</Task>
+"""
+
+_QUERY_WRITER_SYSTEM_MESSAGE: Final = SystemMessage(content=QUERY_WRITER_SYSTEM_PROMPT)
+_QUERY_WRITER_BATCH_SYSTEM_MESSAGE: Final = SystemMessage(content=QUERY_WRITER_BATCH_SYSTEM_PROMPT)
+_render_query_writer_user_prompt = compile_prompt(QUERY_WRITER_USER_PROMPT)
+_render_query_writer_batch_user_prompt = compile_prompt(QUERY_WRITER_BATCH_USER_PROMPT)
+_QUERY_WRITER_STEP: Final = NodeBase.QUERY_WRITER
+_MAX_TOPICS_PER_CALL: Final = 8  # Keeps a single batched response well within output token limits
+_MAX_PASSTHROUGH_QUERY_LENGTH: Final = 400  # Longer topics are rewritten into a search query by the LLM
+
+
+class BatchedQueries(BaseModel):
+    groups: list[Queries]
+
+
+class QueryWriterState(Protocol):
+    """Graph state fields read and written by QueryWriter.run"""
+    topic: str | list[str]
+    steps: list[str]
+    token_usage: dict[Any, dict[str, int]]
+    search_queries: list[SearchQuery]
+
+
+StateT = TypeVar('StateT', bound=QueryWriterState)
+
+
+def _get_query_llms(model_name: ModelNames,
+                    model_provider: LlmServers,
+                    api_key: SecretStr,
+                    model_args: dict[str, Any]) -> tuple[Runnable, Runnable, Runnable]:
+    """
+    Returns the runnables used by QueryWriter: structured output for Queries and for BatchedQueries, which return
+    validated models directly, and a JSON-mode binding for streaming, which needs the raw response text.
+    """
+    # QueryWriter instances are often created per request; the chat model comes from the get_llm pool, so they share
+    # it (and a new one is created after close_cached_llms), while the bindings are cheap to create per instance
+    base_llm = get_llm(model_name=model_name,
+                       model_provider=model_provider,
+                       api_key=api_key,
+                       model_args=model_args)
+    return (
+        base_llm.with_structured_output(Queries, method='json_schema'),
+        base_llm.with_structured_output(BatchedQueries, method='json_schema'),
+        base_llm.bind(response_format={"type": "json_object"}),
+    )
+
+
+def _check_no_running_loop(method: str) -> None:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:  # No running loop, as expected
+        return
+    raise RuntimeError(f'QueryWriter.{method} cannot be called from a running event loop; '
+                       f'await generate_queries_batch (or generate_queries_batched) instead')
+
 
 class QueryWriter:
     def __init__(self, model_params: dict[str, Any], configuration_module_prefix: str):
         self.model_name = model_params['model']
         self.configuration_module_prefix: Final = configuration_module_prefix
-        base_llm = get_llm(model_name=model_params['model'],
-                           model_provider=model_params['model_provider'],
-                           api_key=model_params['api_key'],
-                           model_args=model_params['model_args'])
+        self.model_name_alias = get_model_name_alias(model_name=self.model_name,
+                                                     model_provider=model_params['model_provider'])
+        self.structured_llm, self.batch_structured_llm, self.json_llm = _get_query_llms(
+            model_name=model_params['model'],
+            model_provider=model_params['model_provider'],
+            api_key=model_params['api_key'],
+            model_args=model_params['model_args'],
+        )
 
-    def run(self, state: BaseModel, config: RunnableConfig) -> BaseModel:
+    def run(self, state: StateT, config: RunnableConfig) -> StateT:
 
-        if not hasattr(state, 'topic'):
+        if __debug__ and not hasattr(state, 'topic'):  # Static checkers enforce QueryWriterState; python -O skips this
             raise AttributeError("State must have a 'topic' attribute")
-        
+
         configurable = get_config_from_runnable(
             configuration_module_prefix = self.configuration_module_prefix,
             config = config
         )
-        state.steps.append(NodeBase.QUERY_WRITER)
+        topics = state.topic if isinstance(state.topic, list) else [state.topic]
+
+        # A single query per topic can be the topic itself, which saves the LLM round-trip (opt-in)
+        skip_llm = (getattr(configurable, 'skip_llm_when_single', False) and (configurable.number_of_queries == 1)
+                    and all(0 < len(topic.strip()) <= _MAX_PASSTHROUGH_QUERY_LENGTH for topic in topics))
+        if not skip_llm:
+            _check_no_running_loop(method='run')  # Before the state is changed
+        state.steps.append(_QUERY_WRITER_STEP)
+
+        if skip_llm:
+            state.search_queries = [SearchQuery(search_query=topic.strip(), aspect='primary', rationale='direct')
+                                    for topic in topics]
+            return state
+
+        out = self.run_batch(topics=topics, number_of_queries=configurable.number_of_queries)
+
+        # Usage deltas of the concurrent calls are folded into the state's accumulator once, after they complete
+        token_usage = state.token_usage.setdefault(self.model_name, {'input_tokens': 0, 'output_tokens': 0})
+        update_token_usage(token_usage=token_usage, usages=[t['token_usage'] for t in out])
+        state.search_queries = [q for t in out for q in t['search_queries']]
+        return state
+
+    def run_batch(self, topics: list[str], number_of_queries: int, single_call: bool = False) -> list[dict[str, Any]]:
         """
-        instructions = QUERY_WRITER_INSTRUCTIONS.format(topic=state.topic,
-                                                        today=datetime.date.today().isoformat(),
-                                                        number_of_queries=configurable.number_of_queries)
-        with get_usage_metadata_callback() as cb:
-            results = self.base_llm.invoke(instructions, response_format = {"type": "json_object"})
-            state.token_usage[self.model_name]['input_tokens'] += cb.usage_metadata[self.model_name]['input_tokens']
-            state.token_usage[self.model_name]['output_tokens'] += cb.usage_metadata[self.model_name]['output_tokens']
-            json_dict = json.loads(results.content)
+        Generate search queries for several topics concurrently.
+
+        The LLM calls are overlapped with asyncio.gather, so the wall time is bounded by the
+        slowest call instead of the sum of all calls. With single_call=True, all topics are
+        packed into one LLM call instead (see generate_queries_batched).
+        Results preserve the order of topics.
         """
+        _check_no_running_loop(method='run_batch')  # Before the coroutine is created, so that none is left unawaited
+        generate = self.generate_queries_batched if single_call else self.generate_queries_batch
+        return run_sync(generate(topics=topics, number_of_queries=number_of_queries))
 
-        ## TODO
-        raise NotImplementedError('This shall be parallelized (in accordance with question-tracing in SummaryWriter)')
-        state.search_queries = [SearchQuery(**q) for q in json_dict['queries']]
-        return state
+    async def generate_queries_batch(self, topics: list[str], number_of_queries: int) -> list[dict[str, Any]]:
+        tasks = [self.generate_queries(topic=topic, number_of_queries=number_of_queries) for topic in topics]
+        return await asyncio.gather(*tasks)
+
+    async def generate_queries_batched(self, topics: list[str], number_of_queries: int) -> list[dict[str, Any]]:
+        """
+        Generate search queries for several topics with a single LLM call.
 
+        One round-trip replaces one call per topic. The token usage of the call is reported on the first
+        topic's entry (zeros on the others), so summing over the results gives the usage of the batch.
+        Falls back to one call per topic if there are too many topics for a single response, or if the
+        response does not contain exactly one group of queries per topic.
+        """
+        if (len(topics) < 2) or (len(topics) > _MAX_TOPICS_PER_CALL):
+            return await self.generate_queries_batch(topics=topics, number_of_queries=number_of_queries)
 
-    async def generate_queries(self, topic: str, number_of_queries: int):
-        instructions = QUERY_WRITER_INSTRUCTIONS.format(topic=topic,
-                                                        today=datetime.date.today().isoformat(),
-                                                        number_of_queries=number_of_queries)
+        messages = [
+            _QUERY_WRITER_BATCH_SYSTEM_MESSAGE,
+            HumanMessage(content=_render_query_writer_batch_user_prompt(
+                topics='\n'.join([f'<topic index="{i}">{topic}</topic>' for i, topic in enumerate(topics, 1)]),
+                today=today_iso(),
+                number_of_queries=number_of_queries,
+                number_of_topics=len(topics),
+            )),
+        ]
         with get_usage_metadata_callback() as cb:
-            results = await self.base_llm.ainvoke(instructions, response_format={"type": "json_object"})
-            token_usage = {
-                'input_tokens': cb.usage_metadata[self.model_name]['input_tokens'],
-                'output_tokens': cb.usage_metadata[self.model_name]['output_tokens'],
+            try:
+                groups = (await self.batch_structured_llm.ainvoke(messages)).groups
+            except ValueError:  # Output that does not match the schema (OutputParserException)
+                groups = []
+            token_usage = get_token_usage(usage_metadata=cb.usage_metadata, model_name_alias=self.model_name_alias)
+
+        if len(groups) != len(topics):
+            out = await self.generate_queries_batch(topics=topics, number_of_queries=number_of_queries)
+            update_token_usage(token_usage=out[0]['token_usage'], usages=[token_usage])
+            return out
+
+        no_usage = {'input_tokens': 0, 'output_tokens': 0}
+        return [
+            {
+                'search_queries': group.queries,
+                'token_usage': token_usage if i == 0 else dict(no_usage),
             }
+            for i, group in enumerate(groups)
+        ]
 
-            json_dict = json.loads(results.content)
-            search_queries = [SearchQuery(**q) for q in json_dict['queries']]
+    @staticmethod
+    def _messages(topic: str, number_of_queries: int) -> list[BaseMessage]:
+        return [
+            _QUERY_WRITER_SYSTEM_MESSAGE,
+            HumanMessage(content=_render_query_writer_user_prompt(topic=topic,
+                                                                  today=today_iso(),
+                                                                  number_of_queries=number_of_queries)),
+        ]
+
+    async def generate_queries(self, topic: str, number_of_queries: int):
+        messages = self._messages(topic=topic, number_of_queries=number_of_queries)
+        with get_usage_metadata_callback() as cb:
+            results: Queries = await self.structured_llm.ainvoke(messages)
+            token_usage = get_token_usage(usage_metadata=cb.usage_metadata, model_name_alias=self.model_name_alias)
+
+        search_queries = results.queries
 
         return {
             'search_queries': search_queries,
             'token_usage': token_usage,
         }
+
+    async def stream_queries(self,
+                             topic: str,
+                             number_of_queries: int,
+                             token_usage: dict[str, int] | None = None) -> AsyncIterator[SearchQuery]:
+        """
+        Generate search queries for a topic, yielding each query as soon as the LLM has finished emitting it.
+
+        The response is streamed and parsed incrementally, so consumers (e.g. WebSearchNode.run_streaming_async)
+        can start searching for the first queries while the remaining ones are still being generated.
+
+        Args:
+            topic (str): The topic to generate search queries for.
+            number_of_queries (int): Number of queries to generate.
+            token_usage (dict[str, int], optional): Accumulator that is updated with the token usage of the
+                                                    LLM call once the stream is exhausted.
+
+        Yields:
+            SearchQuery: The generated queries, in the order the LLM emits them.
+        """
+        messages = self._messages(topic=topic, number_of_queries=number_of_queries)
+        text = ''
+        n_yielded = 0
+        # Usage is read from the chunks rather than from get_usage_metadata_callback, whose context would stay
+        # active in the consumer while the generator is suspended and also count the consumer's own LLM calls
+        usages = []
+        async for chunk in self.json_llm.astream(messages):
+            text += chunk.text
+            if chunk.usage_metadata:
+                usages.append(chunk.usage_metadata)
+            try:
+                partial = from_json(text, allow_partial=True)  # Rust parser, re-run on every chunk
+            except ValueError:  # Not enough text yet
+                continue
+            queries = partial.get('queries', []) if isinstance(partial, dict) else []
+            # Every query except the last one is complete once the next one has started
+            for q in queries[n_yielded:-1]:
+                yield SearchQuery.model_validate(q)
+                n_yielded += 1
+
+        for search_query in Queries.model_validate_json(text).queries[n_yielded:]:
+            yield search_query
+
+        if token_usage is not None:
+            update_token_usage(token_usage=token_usage, usages=usages)
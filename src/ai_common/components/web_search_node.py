@@ -1,26 +1,51 @@
 import asyncio
-from typing import Any, Final
+import logging
+import os
+import time
+from contextlib import nullcontext
+from typing import Any, AsyncIterable, Final, TypeAlias, TYPE_CHECKING
 from pydantic import BaseModel, SecretStr
 from langchain_core.callbacks import get_usage_metadata_callback
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 from langchain_core.runnables import RunnableConfig
 
 from ai_common import (
+    canonicalize_url,
+    compile_prompt,
+    DiskCache,
+    LlmServers,
+    SearchQuery,
     WebSearch,
     format_sources,
     get_config_from_runnable,
     get_llm,
     get_model_name_alias,
+    get_token_usage,
     NodeBase,
+    run_sync,
+    update_token_usage,
 )
 
+if TYPE_CHECKING:
+    import httpx
 
-SUMMARIZER_INSTRUCTIONS = """
+
+logger = logging.getLogger(__name__)
+
+# Static system prompts keep an identical prefix across calls for provider-side prompt caching;
+# only the topic and the per-source context are sent in the human message.
+SUMMARIZER_SYSTEM_PROMPT = """
 You are a world class researcher who is working on a report about a specific topic.
 
 <goal>
 Generate a very high quality informative summary of the given context in accordance with the topic.
 </goal>
 
+Prepare your summary according to the topic. 
+Include all necessary information related with the topic in your summary.
+"""
+
+SUMMARIZER_USER_PROMPT = """
 The topic you are working on:
 <topic>
 {topic}
@@ -30,42 +55,218 @@ The context to use in generating the informative summary:
 <context>
 {context}
 </context>
+"""
+
+SUMMARY_REDUCER_SYSTEM_PROMPT = """
+You are a world class researcher who is working on a report about a specific topic.
+
+<goal>
+Merge the given partial summaries of a single source into one very high quality informative summary.
+</goal>
 
 Prepare your summary according to the topic. 
-Include all necessary information related with the topic in your summary.
+Include all necessary information related with the topic in your summary, without repetition.
+"""
+
+SUMMARY_REDUCER_USER_PROMPT = """
+The topic you are working on:
+<topic>
+{topic}
+</topic>
+
+The partial summaries, in the order of the source:
+<summaries>
+{summaries}
+</summaries>
+"""
+
+BATCH_SUMMARIZER_SYSTEM_PROMPT = """
+You are a world class researcher who is working on a report about a specific topic.
+
+<goal>
+Generate a very high quality informative summary of each of the given sources in accordance with the topic.
+</goal>
+
+Prepare each summary according to the topic, using only the content of its own source. 
+Include all necessary information related with the topic in each summary.
+
+<Format>
+Format your response as a JSON object with one field:
+    - summaries: One entry per source, each with the following two fields:
+        - index: The index of the source, as given in its <source> tag.
+        - summary: The summary of the source.
+</Format>
 """
 
+BATCH_SUMMARIZER_USER_PROMPT = """
+The topic you are working on:
+<topic>
+{topic}
+</topic>
+
+The sources to summarize:
+{sources}
+
+It is very important that you return exactly {number_of_sources} summaries, one for each source.
+"""
+
+_SUMMARIZER_SYSTEM_MESSAGE: Final = SystemMessage(content=SUMMARIZER_SYSTEM_PROMPT)
+_BATCH_SUMMARIZER_SYSTEM_MESSAGE: Final = SystemMessage(content=BATCH_SUMMARIZER_SYSTEM_PROMPT)
+_SUMMARY_REDUCER_SYSTEM_MESSAGE: Final = SystemMessage(content=SUMMARY_REDUCER_SYSTEM_PROMPT)
+_render_summarizer_user_prompt = compile_prompt(SUMMARIZER_USER_PROMPT)
+_render_summary_reducer_user_prompt = compile_prompt(SUMMARY_REDUCER_USER_PROMPT)
+_render_batch_summarizer_user_prompt = compile_prompt(BATCH_SUMMARIZER_USER_PROMPT)
+
+
+def _summarizer_messages(topic: str, context: str) -> list[BaseMessage]:
+    return [
+        _SUMMARIZER_SYSTEM_MESSAGE,
+        HumanMessage(content=_render_summarizer_user_prompt(topic=topic, context=context)),
+    ]
+
+
+def _batch_summarizer_messages(topic: str, contexts: list[str]) -> list[BaseMessage]:
+    sources = '\n'.join([f'<source index="{i}">\n{context}\n</source>' for i, context in enumerate(contexts, 1)])
+    return [
+        _BATCH_SUMMARIZER_SYSTEM_MESSAGE,
+        HumanMessage(content=_render_batch_summarizer_user_prompt(topic=topic,
+                                                                  sources=sources,
+                                                                  number_of_sources=len(contexts))),
+    ]
+
+
+def _summary_reducer_messages(topic: str, summaries: str) -> list[BaseMessage]:
+    return [
+        _SUMMARY_REDUCER_SYSTEM_MESSAGE,
+        HumanMessage(content=_render_summary_reducer_user_prompt(topic=topic, summaries=summaries)),
+    ]
+
+
+_WEB_SEARCH_STEP: Final = NodeBase.WEB_SEARCH
+_DEFAULT_MAX_CONCURRENT_SUMMARIES: Final = 8
+_DEFAULT_SUMMARY_CHUNK_COUNT: Final = 4
+_DEFAULT_SUMMARY_BATCH_SIZE: Final = 4
+_MAX_SOURCE_LENGTH: Final = 102_400  # 100K
+
+
+def _split_content(content: str, chunk_chars: int, max_chunks: int) -> list[str]:
+    """
+    Split content into at most max_chunks chunks of at most chunk_chars characters, preferring paragraph boundaries.
+    Content beyond max_chunks chunks is dropped.
+    """
+    chunks = []
+    start = 0
+    while (start < len(content)) and (len(chunks) < max_chunks):
+        end = start + chunk_chars
+        if end < len(content):
+            boundary = content.rfind('\n\n', start, end)
+            if boundary > start:
+                end = boundary
+        chunks.append(content[start:end])
+        start = end
+    return chunks
+
+
+class SourceSummary(BaseModel):
+    index: int
+    summary: str
+
+
+class SourceSummaries(BaseModel):
+    summaries: list[SourceSummary]
+
+
+def _query_key(search_query: str) -> str:
+    return search_query.strip().casefold()
+
+
+# Canonical URL of a source and the text its summary is made from
+_SummaryKey: TypeAlias = tuple[str, str | None]
+
+
+def _summary_key(url_key: str, source: dict[str, Any]) -> _SummaryKey:
+    raw_content = source['raw_content']
+    return url_key, (raw_content if raw_content is not None else source['content'])
+
+
+async def _select(task: asyncio.Task, index: int) -> Any:
+    return (await task)[index]
+
 
 class WebSearchNode:
     def __init__(self,
                  web_search_api_key: SecretStr,
                  model_params: dict[str, Any],
-                 configuration_module_prefix: str):
-        self.web_search = WebSearch(api_key=web_search_api_key)
+                 configuration_module_prefix: str,
+                 http_transport: "httpx.AsyncBaseTransport | None" = None,
+                 summary_cache: DiskCache | None = None,
+                 search_cache: DiskCache | None = None):
+        # Searches reuse the pooled connections of one HTTP client (or of http_transport) for the lifetime of the node
+        self.web_search = WebSearch(api_key=web_search_api_key,
+                                    http_transport=http_transport,
+                                    search_cache=search_cache)
         self.configuration_module_prefix: Final = configuration_module_prefix
         self.model_name = model_params['model']
+        self.model_provider = model_params['model_provider']
         self.model_name_alias = get_model_name_alias(model_name=self.model_name,
                                                      model_provider=model_params['model_provider'])
         self.base_llm = get_llm(model_name=model_params['model'],
                                 model_provider=model_params['model_provider'],
                                 api_key=model_params['api_key'],
                                 model_args=model_params['model_args'])
+        self.batch_summaries_llm = self.base_llm.with_structured_output(SourceSummaries, method='json_schema')
+        # Summaries of sources seen in earlier runs (e.g. reruns, retries) are read from here instead of the LLM
+        self.summary_cache = summary_cache
 
 
-    async def summarize_source(self, topic: str, source_dict: dict[str, Any]) -> dict[str, Any]:
-        max_length = 102_400  # 100K
+    async def summarize_source(self,
+                               topic: str,
+                               source_dict: dict[str, Any],
+                               semaphore: asyncio.Semaphore | None = None,
+                               chunk_chars: int | None = None,
+                               max_chunks: int = _DEFAULT_SUMMARY_CHUNK_COUNT) -> dict[str, Any]:
+        """
+        Summarize the raw content of a source according to the topic.
 
+        Content longer than chunk_chars is summarized map-reduce style: it is split into at most max_chunks chunks
+        at paragraph boundaries, the chunks are summarized concurrently, and the partial summaries are merged with a
+        final call. This keeps every prompt short, instead of prefilling up to 100K characters in a single call.
+
+        With a summary_cache, summaries are keyed by the model, the topic, the chunking parameters and the content,
+        and cache hits skip the LLM (and the semaphore) entirely.
+        """
         if source_dict['raw_content'] is not None:
-            raw_content = source_dict['raw_content'][:max_length]
-            instructions = SUMMARIZER_INSTRUCTIONS.format(topic=topic, context=raw_content)
+            raw_content = source_dict['raw_content'][:_MAX_SOURCE_LENGTH]
+
+            if self.summary_cache is not None:
+                cache_key = self._summary_cache_key(topic=topic,
+                                                    raw_content=raw_content,
+                                                    chunk_chars=chunk_chars,
+                                                    max_chunks=max_chunks)
+                content = await self.summary_cache.aget(cache_key)
+                if content is not None:  # No LLM call, hence no token usage
+                    return {
+                        'content': content,
+                        'token_usage': {'input_tokens': 0, 'output_tokens': 0},
+                    }
 
             with get_usage_metadata_callback() as cb:
-                summary = await self.base_llm.ainvoke(instructions)
-                token_usage = {
-                    'input_tokens': cb.usage_metadata[self.model_name_alias]['input_tokens'],
-                    'output_tokens': cb.usage_metadata[self.model_name_alias]['output_tokens'],
-                }
-                content = summary.content
+                if (chunk_chars is None) or (len(raw_content) <= chunk_chars):
+                    content = await self._ainvoke(messages=_summarizer_messages(topic=topic, context=raw_content),
+                                                  semaphore=semaphore)
+                else:
+                    partial_summaries = await asyncio.gather(*[
+                        self._ainvoke(messages=_summarizer_messages(topic=topic, context=chunk), semaphore=semaphore)
+                        for chunk in _split_content(content=raw_content, chunk_chars=chunk_chars, max_chunks=max_chunks)
+                    ])
+                    content = await self._ainvoke(
+                        messages=_summary_reducer_messages(topic=topic, summaries='\n\n'.join(partial_summaries)),
+                        semaphore=semaphore
+                    )
+                token_usage = get_token_usage(usage_metadata=cb.usage_metadata, model_name_alias=self.model_name_alias)
+
+            if self.summary_cache is not None:
+                await self.summary_cache.aset(cache_key, content)
         else:
             content = source_dict['content']
             token_usage = {
@@ -78,11 +279,113 @@ class WebSearchNode:
             'token_usage': token_usage
         }
 
+    async def summarize_sources(self,
+                                topic: str,
+                                source_dicts: list[dict[str, Any]],
+                                semaphore: asyncio.Semaphore | None = None,
+                                chunk_chars: int | None = None,
+                                max_chunks: int = _DEFAULT_SUMMARY_CHUNK_COUNT) -> list[dict[str, Any]]:
+        """
+        Summarize several sources with a single structured-output LLM call, saving one round-trip per source.
+
+        Only sources whose raw content fits into a single chunk and that are not in the summary_cache are batched.
+        Cache hits are returned as they are; the others, and all remaining sources if fewer than two can be batched,
+        go through summarize_source. If the response
+        does not contain exactly one summary per batched source, they are summarized one by one instead.
+        The token usage of the batched call is reported on the first batched source (zeros on the others), so
+        summing over the results gives the usage of the batch. Results preserve the order of source_dicts.
+        """
+        summarize_kwargs = {'semaphore': semaphore, 'chunk_chars': chunk_chars, 'max_chunks': max_chunks}
+        contexts = {}
+        for i, source_dict in enumerate(source_dicts):
+            if source_dict['raw_content'] is None:
+                continue
+            raw_content = source_dict['raw_content'][:_MAX_SOURCE_LENGTH]
+            if (chunk_chars is not None) and (len(raw_content) > chunk_chars):
+                continue
+            contexts[i] = raw_content
+
+        # Cache hits are read once here and returned as they are, instead of being looked up again by summarize_source
+        cached = {}
+        if (self.summary_cache is not None) and contexts:
+            cache_keys = {i: self._summary_cache_key(topic=topic,
+                                                     raw_content=raw_content,
+                                                     chunk_chars=chunk_chars,
+                                                     max_chunks=max_chunks)
+                          for i, raw_content in contexts.items()}
+            contents = await asyncio.gather(*[self.summary_cache.aget(cache_key) for cache_key in cache_keys.values()])
+            cached = {i: {'content': content, 'token_usage': {'input_tokens': 0, 'output_tokens': 0}}
+                      for i, content in zip(cache_keys, contents) if content is not None}
+            contexts = {i: raw_content for i, raw_content in contexts.items() if i not in cached}
+
+        if len(contexts) < 2:
+            out = iter(await asyncio.gather(*[
+                self.summarize_source(topic=topic, source_dict=source_dict, **summarize_kwargs)
+                for i, source_dict in enumerate(source_dicts) if i not in cached
+            ]))
+            return [cached[i] if i in cached else next(out) for i in range(len(source_dicts))]
+
+        # Created before the usage callback below, so that their usage is not counted twice
+        others = asyncio.gather(*[self.summarize_source(topic=topic, source_dict=source_dict, **summarize_kwargs)
+                                  for i, source_dict in enumerate(source_dicts)
+                                  if (i not in contexts) and (i not in cached)])
+
+        with get_usage_metadata_callback() as cb:
+            try:
+                async with semaphore or nullcontext():
+                    response = await self.batch_summaries_llm.ainvoke(
+                        _batch_summarizer_messages(topic=topic, contexts=list(contexts.values()))
+                    )
+                summaries = {item.index: item.summary for item in response.summaries}
+            except ValueError:  # Output that does not match the schema (OutputParserException)
+                summaries = {}
+            token_usage = get_token_usage(usage_metadata=cb.usage_metadata, model_name_alias=self.model_name_alias)
+
+        if sorted(summaries) == list(range(1, len(contexts) + 1)):
+            batched = [
+                {
+                    'content': summaries[k],
+                    'token_usage': token_usage if k == 1 else {'input_tokens': 0, 'output_tokens': 0},
+                }
+                for k in range(1, len(contexts) + 1)
+            ]
+            if self.summary_cache is not None:
+                await asyncio.gather(*[self.summary_cache.aset(cache_keys[i], summary['content'])
+                                       for i, summary in zip(contexts, batched)])
+        else:
+            batched = await asyncio.gather(*[self.summarize_source(topic=topic,
+                                                                   source_dict=source_dicts[i],
+                                                                   **summarize_kwargs)
+                                             for i in contexts])
+            update_token_usage(token_usage=batched[0]['token_usage'], usages=[token_usage])
+
+        batched = iter(batched)
+        others = iter(await others)
+        return [cached[i] if i in cached else next(batched) if i in contexts else next(others)
+                for i in range(len(source_dicts))]
+
+    def _summary_cache_key(self, topic: str, raw_content: str, chunk_chars: int | None, max_chunks: int) -> str:
+        return DiskCache.make_key(self.model_name_alias, topic, str(chunk_chars), str(max_chunks), raw_content)
+
+    async def _ainvoke(self, messages: list[BaseMessage], semaphore: asyncio.Semaphore | None) -> str:
+        async with semaphore or nullcontext():  # Caps in-flight LLM calls to avoid provider rate limits
+            summary = await self.base_llm.ainvoke(messages)
+        return summary.text
+
+    async def aclose(self) -> None:
+        """Close the web search client. Chat model clients are managed by their LangChain integrations."""
+        await self.web_search.aclose()
+
     def run(self, state: BaseModel, config: RunnableConfig) -> BaseModel:
-        event_loop = asyncio.new_event_loop()
-        state = event_loop.run_until_complete(self.run_async(state=state, config=config))
-        event_loop.close()
-        return state
+        """
+        Synchronous wrapper of run_async for sync graph nodes. Inside a running event loop (async graphs, Jupyter),
+        await run_async directly instead.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:  # No running loop, as expected
+            return run_sync(self.run_async(state=state, config=config))
+        raise RuntimeError('WebSearchNode.run cannot be called from a running event loop; await run_async instead')
 
 
     async def run_async(self, state: BaseModel, config: RunnableConfig) -> BaseModel:
@@ -111,7 +414,10 @@ class WebSearchNode:
         Note:
             The method uses the configured search parameters (category, days back,
             max tokens per source, max results per query) to control search behavior.
-            Each source is summarized using the base LLM with truncated content (max 100K chars).
+            Each source is summarized using the base LLM with truncated content (max 100K chars). Sources longer than
+            4 * max_tokens_per_source chars are summarized in chunks (at most summary_chunk_count, if configured),
+            which are then merged. With batch_summarize, up to summary_batch_size short sources of a query are
+            summarized together in a single LLM call.
         """
         if not hasattr(state, 'search_queries'):
             raise AttributeError("State must have a 'search_queries' attribute")
@@ -123,42 +429,198 @@ class WebSearchNode:
             if not hasattr(query, 'search_query'):
                 raise AttributeError(f"Query at index {i} must have a 'search_query' attribute")
 
+        started = time.perf_counter()
         configurable = get_config_from_runnable(
             configuration_module_prefix=self.configuration_module_prefix,
             config=config
         )
 
-        unique_sources = await self.web_search.search(
-            search_queries = [query.search_query for query in state.search_queries],
-            search_category = configurable.search_category,
-            number_of_days_back = configurable.number_of_days_back,
-            max_results_per_query = configurable.max_results_per_query,
-            search_depth = configurable.search_depth,
-            chunks_per_source=configurable.chunks_per_source,
-            include_images=configurable.include_images,
-            include_image_descriptions=configurable.include_image_descriptions,
-            include_favicon=configurable.include_favicon,
+        search_kwargs = self._search_kwargs(configurable=configurable)
+        summarize_kwargs = self._summarize_kwargs(configurable=configurable)
+        batch_size = self._summary_batch_size(configurable=configurable)
+        summaries = {}
+        # Queries that differ only in case or surrounding whitespace are searched once
+        unique_queries = {}
+        for query in state.search_queries:
+            unique_queries.setdefault(_query_key(query.search_query), query.search_query)
+        search_tasks = [
+            asyncio.create_task(self._search_and_summarize(query=query,
+                                                           topic=state.topic,
+                                                           search_kwargs=search_kwargs,
+                                                           summarize_kwargs=summarize_kwargs,
+                                                           batch_size=batch_size,
+                                                           summaries=summaries))
+            for query in unique_queries.values()
+        ]
+        return await self._collect_summaries(state=state,
+                                             configurable=configurable,
+                                             search_tasks=search_tasks,
+                                             summaries=summaries,
+                                             started=started)
+
+    async def run_streaming_async(self,
+                                  state: BaseModel,
+                                  config: RunnableConfig,
+                                  search_queries: AsyncIterable[SearchQuery]) -> BaseModel:
+        """
+        Same as run_async, but takes the search queries from an async iterable (e.g. QueryWriter.stream_queries)
+        and starts the web search for each query as soon as it arrives, overlapping query generation with searching.
+
+        The received queries are also stored in state.search_queries.
+        """
+        started = time.perf_counter()
+        configurable = get_config_from_runnable(
+            configuration_module_prefix=self.configuration_module_prefix,
+            config=config
         )
+        search_kwargs = self._search_kwargs(configurable=configurable)
+        summarize_kwargs = self._summarize_kwargs(configurable=configurable)
+        batch_size = self._summary_batch_size(configurable=configurable)
+
+        state.search_queries = []
+        summaries = {}
+        search_tasks = []
+        searched = set()
+        async for query in search_queries:
+            state.search_queries.append(query)
+            if (key := _query_key(query.search_query)) in searched:
+                continue
+            searched.add(key)
+            search_tasks.append(asyncio.create_task(self._search_and_summarize(query=query.search_query,
+                                                                               topic=state.topic,
+                                                                               search_kwargs=search_kwargs,
+                                                                               summarize_kwargs=summarize_kwargs,
+                                                                               batch_size=batch_size,
+                                                                               summaries=summaries)))
+
+        if not search_tasks:
+            raise ValueError("State must contain at least one search query")
+
+        return await self._collect_summaries(state=state,
+                                             configurable=configurable,
+                                             search_tasks=search_tasks,
+                                             summaries=summaries,
+                                             started=started)
+
+    @staticmethod
+    def _search_kwargs(configurable: BaseModel) -> dict[str, Any]:
+        return {
+            'search_category': configurable.search_category,
+            'number_of_days_back': configurable.number_of_days_back,
+            'max_results_per_query': configurable.max_results_per_query,
+            'search_depth': configurable.search_depth,
+            'chunks_per_source': configurable.chunks_per_source,
+            'include_images': configurable.include_images,
+            'include_image_descriptions': configurable.include_image_descriptions,
+            'include_favicon': configurable.include_favicon,
+        }
+
+    def _summarize_kwargs(self, configurable: BaseModel) -> dict[str, Any]:
+        """
+        Keyword arguments of summarize_source for one run.
+
+        Sources are summarized in chunks of 4 * max_tokens_per_source characters (about max_tokens_per_source tokens),
+        at most configurable.summary_chunk_count of them if the configuration defines it.
+
+        The semaphore limits the number of concurrent summarization calls. Its limit is taken from
+        configurable.max_concurrent_summaries if the configuration defines it. Otherwise, OLLAMA_NUM_PARALLEL is
+        honored for Ollama, falling back to _DEFAULT_MAX_CONCURRENT_SUMMARIES.
+        A new semaphore is created per run, since asyncio primitives are bound to a single event loop.
+        """
+        limit = getattr(configurable, 'max_concurrent_summaries', None)
+        if (limit is None) and (self.model_provider == LlmServers.OLLAMA):
+            limit = int(os.environ.get('OLLAMA_NUM_PARALLEL', 0)) or None
+        return {
+            'semaphore': asyncio.Semaphore(limit or _DEFAULT_MAX_CONCURRENT_SUMMARIES),
+            'chunk_chars': configurable.max_tokens_per_source * 4,
+            'max_chunks': getattr(configurable, 'summary_chunk_count', None) or _DEFAULT_SUMMARY_CHUNK_COUNT,
+        }
+
+    @staticmethod
+    def _summary_batch_size(configurable: BaseModel) -> int:
+        """
+        Number of sources summarized per LLM call: configurable.summary_batch_size (default 4) if the configuration
+        enables configurable.batch_summarize, otherwise 1 (one call per source).
+        """
+        if not getattr(configurable, 'batch_summarize', False):
+            return 1
+        return getattr(configurable, 'summary_batch_size', None) or _DEFAULT_SUMMARY_BATCH_SIZE
+
+    async def _search_and_summarize(self,
+                                    query: str,
+                                    topic: str,
+                                    search_kwargs: dict[str, Any],
+                                    summarize_kwargs: dict[str, Any],
+                                    batch_size: int,
+                                    summaries: dict[_SummaryKey, asyncio.Task]) -> list[tuple[str, _SummaryKey, dict]]:
+        """
+        Search for one query and, as soon as its results arrive, start summarizing every source that no other
+        query has returned yet. Summaries run while the searches of the other queries are still in flight.
+
+        Returns the (canonical URL, summary key, source) triples found for the query, in rank order.
+        """
+        sources = await self.web_search.search(search_queries=[query], **search_kwargs)
+        found = [(canonicalize_url(url), source) for url, source in sources.items()]
+        found = [(url_key, _summary_key(url_key=url_key, source=source), source) for url_key, source in found]
+        # Variants of a page found by different queries are summarized once, unless their contents differ
+        new_sources = [(key, source) for _, key, source in found if key not in summaries]
+        if batch_size > 1:
+            for i in range(0, len(new_sources), batch_size):
+                batch = new_sources[i:i + batch_size]
+                task = asyncio.create_task(self.summarize_sources(topic=topic,
+                                                                  source_dicts=[source for _, source in batch],
+                                                                  **summarize_kwargs))
+                for j, (key, _) in enumerate(batch):
+                    summaries[key] = asyncio.create_task(_select(task=task, index=j))
+        else:
+            for key, source in new_sources:
+                summaries[key] = asyncio.create_task(self.summarize_source(topic=topic,
+                                                                         source_dict=source,
+                                                                         **summarize_kwargs))
+        return found
 
-        tasks = [self.summarize_source(topic=state.topic, source_dict=v) for v in unique_sources.values()]
-        out = await asyncio.gather(*tasks)
+    async def _collect_summaries(self,
+                                 state: BaseModel,
+                                 configurable: BaseModel,
+                                 search_tasks: list[asyncio.Task],
+                                 summaries: dict[_SummaryKey, asyncio.Task],
+                                 started: float) -> BaseModel:
+        try:
+            # Sources are ordered by query, then by rank within the query, as with a single deduplicated search. The
+            # kept variant of a page is also the first in that order, whichever query's search happened to finish
+            # first, and it gets the summary of its own content.
+            representatives = {}
+            for found in await asyncio.gather(*search_tasks):
+                for url_key, summary_key, source in found:
+                    representatives.setdefault(url_key, (summary_key, source))
+            # Summaries of variants that were not kept are waited for too, since their tokens are spent already
+            done = dict(zip(summaries, await asyncio.gather(*summaries.values())))
+        except BaseException:
+            for task in search_tasks + list(summaries.values()):
+                task.cancel()
+            raise
+        out = [done[summary_key] for summary_key, _ in representatives.values()]
 
-        state.token_usage[self.model_name]['input_tokens'] += sum([t['token_usage']['input_tokens'] for t in out])
-        state.token_usage[self.model_name]['output_tokens'] += sum([t['token_usage']['output_tokens'] for t in out])
+        # Usage deltas of the concurrent calls are folded into the state's accumulator once, after they complete
+        token_usage = state.token_usage.setdefault(self.model_name, {'input_tokens': 0, 'output_tokens': 0})
+        update_token_usage(token_usage=token_usage, usages=[t['token_usage'] for t in done.values()])
 
         unique_sources = {
-            url: {
-                'title': value['title'],
+            source['url']: {
+                'title': source['title'],
                 'content': summary['content'],
-                'score': value['score'],
+                'score': source['score'],
             }
-            for url, value, summary in zip(unique_sources.keys(), unique_sources.values(), out)
+            for (_, source), summary in zip(representatives.values(), out)
         }
 
         source_str = format_sources(unique_sources=unique_sources,
                                     max_tokens_per_source=configurable.max_tokens_per_source,
                                     include_raw_content=False)
-        state.steps.append(NodeBase.WEB_SEARCH)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('web search: queries=%d sources=%d elapsed=%.3fs',
+                         len(search_tasks), len(unique_sources), time.perf_counter() - started)
+        state.steps.append(_WEB_SEARCH_STEP)
         state.source_str = source_str
         state.unique_sources = unique_sources
         return state
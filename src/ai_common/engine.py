@@ -1,31 +1,52 @@
 import os
 import datetime
+import logging
+import weakref
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any
 
 from .base import GraphBase
 from .enums import LlmServers
 from .llm import load_ollama_model
-from .utils import get_flow_chart
+from .utils import freeze_today, get_flow_chart
+
+
+logger = logging.getLogger(__name__)
+
+_TZ = datetime.timezone(offset=datetime.timedelta(hours=3), name='UTC+3')
+_DEFAULT_HISTORY_MAX = 64  # Messages, i.e. 32 user / assistant turns
 
 
 def save_response(response: str, save_to_folder: str):
-    time_now = datetime.datetime.now().replace(microsecond=0).astimezone(
-        tz=datetime.timezone(offset=datetime.timedelta(hours=3), name='UTC+3'))
+    time_now = datetime.datetime.now().replace(microsecond=0).astimezone(tz=_TZ)
     file_name = os.path.join(save_to_folder, f'response-{time_now.isoformat()}.md')
     with open(file_name, 'w', encoding='utf-8') as f:
         f.write(f'{response}')
 
 
 class Engine:
-    def __init__(self, responder: GraphBase, llm_server: LlmServers, models: list[str], llm_base_url: str, save_to_folder: str):
+    def __init__(self,
+                 responder: GraphBase,
+                 llm_server: LlmServers,
+                 models: list[str],
+                 llm_base_url: str,
+                 save_to_folder: str,
+                 history_max: int | None = None):
 
         if llm_server == LlmServers.OLLAMA:
             for model in models:
                 load_ollama_model(model_name=model, ollama_url=f'{llm_base_url}')
 
-        self.history = []
+        # Only the most recent messages are kept in memory (the responses are also saved to save_to_folder)
+        self.history: deque[dict[str, Any]] = deque(maxlen=history_max or _DEFAULT_HISTORY_MAX)
         self.responder = responder
         self.save_to_folder = save_to_folder
+        # Responses are written in the background, so that get_response returns without waiting for the disk.
+        # A single worker keeps the writes in order; pending writes are completed when the engine is garbage
+        # collected or at interpreter exit, whichever comes first. The finalizer does not keep the engine alive.
+        self._writer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='save_response')
+        weakref.finalize(self, self._writer_executor.shutdown)
 
     def save_flow_chart(self, save_to_folder: str):
         flow_chart = get_flow_chart(rag_model=self.responder)
@@ -33,7 +54,14 @@ class Engine:
 
     def get_response(self, input_dict: dict[str, Any]):
         self.history.append({"role": "user", "content": input_dict})
-        response = self.responder.get_response(input_dict=input_dict, verbose=False)
+        with freeze_today():
+            response = self.responder.get_response(input_dict=input_dict, verbose=False)
         self.history.append({"role": "assistant", "content": response})
-        save_response(response=response, save_to_folder=self.save_to_folder)
+        future = self._writer_executor.submit(save_response, response=response, save_to_folder=self.save_to_folder)
+        future.add_done_callback(_log_save_error)
         return response
+
+
+def _log_save_error(future: Future) -> None:
+    if (not future.cancelled()) and (future.exception() is not None):
+        logger.error('Could not save the response', exc_info=future.exception())
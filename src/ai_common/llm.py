@@ -1,15 +1,22 @@
-from typing import Any
+import asyncio
+import hashlib
+import importlib
+import os
+from collections import OrderedDict
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Any, Callable, Final, TypeAlias
+
+import httpx
+from langchain_core._api import suppress_langchain_beta_warning
+from langchain_core.caches import BaseCache, InMemoryCache, RETURN_VAL_TYPE
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_anthropic import ChatAnthropic
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_groq import ChatGroq
-from langchain_ollama import ChatOllama
-from langchain_openai import ChatOpenAI
-from ollama import Client
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import ChatGeneration
 from pydantic import SecretStr
 
+from .cache import DiskCache
 from .enums import LlmServers, ModelNames
-from .tools import _check_and_pull_ollama_model
 
 
 MODEL_NAME_ALIAS_DICT = {
@@ -50,98 +57,252 @@ MODEL_NAME_ALIAS_DICT = {
     }
 
 
+# Provider SDKs are imported on first use, so that only the SDKs of the providers in use are loaded
+_PROVIDER_CLASS_PATHS = {
+    LlmServers.ANTHROPIC: ('langchain_anthropic', 'ChatAnthropic'),
+    LlmServers.GOOGLE: ('langchain_google_genai', 'ChatGoogleGenerativeAI'),
+    LlmServers.GROQ: ('langchain_groq', 'ChatGroq'),
+    LlmServers.OPENAI: ('langchain_openai', 'ChatOpenAI'),
+    LlmServers.OLLAMA: ('langchain_ollama', 'ChatOllama'),
+}
+_PROVIDER_CLASSES: dict[LlmServers, type[BaseChatModel]] = {}
+
+
+def _get_provider_class(model_provider: LlmServers) -> type[BaseChatModel]:
+    cls = _PROVIDER_CLASSES.get(model_provider)
+    if cls is None:
+        module_name, class_name = _PROVIDER_CLASS_PATHS[model_provider]
+        cls = getattr(importlib.import_module(module_name), class_name)
+        _PROVIDER_CLASSES[model_provider] = cls
+    return cls
+
+
 def load_ollama_model(model_name: str, ollama_url: str) -> None:
+    from .tools import _check_and_pull_ollama_model, _get_ollama_client
+
     _check_and_pull_ollama_model(model_name=model_name, ollama_url=ollama_url)
-    ollama_client = Client(host=ollama_url)
+    ollama_client = _get_ollama_client(ollama_url)
     ollama_client.generate(model=model_name)  # Generate w/ prompt loads the model to memory
 
 
 def get_model_name_alias(model_name: ModelNames, model_provider: LlmServers) -> str:
-    alias = MODEL_NAME_ALIAS_DICT[model_name][model_provider] if model_name in MODEL_NAME_ALIAS_DICT.keys() else model_name.value
+    # Models without a provider specific name are served under their own name
+    alias = MODEL_NAME_ALIAS_DICT.get(model_name, {}).get(model_provider, model_name.value)
     return alias
 
+# Connection pool limits for the provider clients built here, which bound the fan-out of concurrent calls. Idle
+# connections are kept for 30s instead of httpx's default 5s, so they survive the gaps between LLM calls of a graph
+# (e.g. while web searches run).
+_HTTPX_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0)
+# For async clients that the SDKs build and reuse across event loops themselves, with the default keep-alive expiry
+_SDK_HTTPX_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=100)
+
+
+class _LoopLocalAsyncTransport(httpx.AsyncBaseTransport):
+    """
+    Async transport with a connection pool of its own for every event loop.
+
+    Pooled models outlive event loops (e.g. successive run_sync calls), and an open async connection is bound to the
+    loop that opened it, so reusing it from the next loop would fail. Requests are sent through an httpx.AsyncClient
+    per loop, so that the proxy and certificate settings of the environment apply as with the SDKs' own clients.
+    """
+    def __init__(self, limits: httpx.Limits):
+        self._limits = limits
+        self._clients: dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            # The pools of closed loops can neither be used nor closed anymore, they are dropped
+            self._clients = {other: pool for other, pool in self._clients.items() if not other.is_closed()}
+            client = self._clients[loop] = httpx.AsyncClient(limits=self._limits)
+        return await client.send(request, stream=True)
+
+    async def aclose(self) -> None:
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def close(self) -> None:
+        # Called outside of the loops (see close_cached_llms), so their pools are dropped rather than closed
+        self._clients = {}
+
+
+class _ClientTransport(httpx.BaseTransport):
+    # Sends requests through an httpx.Client, for SDKs that build their own client from keyword arguments
+    def __init__(self, limits: httpx.Limits):
+        self._client = httpx.Client(limits=limits)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self._client.send(request, stream=True)
+
+    def close(self) -> None:
+        self._client.close()
+
+
+# Chat models keyed by _client_key, with the HTTP clients and transports created for them here; reusing a model
+# reuses its HTTP clients (and their open connections). The least recently used models are dropped beyond the limit,
+# but not closed, since agents may still hold them.
+_HttpResource: TypeAlias = httpx.Client | httpx.BaseTransport | _LoopLocalAsyncTransport
+_CLIENT_CACHE: OrderedDict[str, tuple[BaseChatModel, tuple[_HttpResource, ...]]] = OrderedDict()
+_CLIENT_CACHE_SIZE: Final = 32
+
+
+def _freeze(obj: Any) -> Any:
+    """
+    Hashable, order independent form of a configuration value (e.g. model_args), for use as a cache key.
+
+    Containers are tagged with their kind, so that e.g. a dict and a list of pairs do not collide. Secrets only
+    enter as a digest. Other unhashable values are represented by their repr.
+    """
+    if isinstance(obj, Mapping):
+        items = ((key, _freeze(value)) for key, value in obj.items())
+        return 'dict', tuple(sorted(items, key=lambda item: repr(item[0])))
+    if isinstance(obj, (list, tuple)):
+        return type(obj).__name__, tuple(_freeze(value) for value in obj)
+    if isinstance(obj, (set, frozenset)):
+        return 'set', tuple(sorted((_freeze(value) for value in obj), key=repr))
+    if isinstance(obj, SecretStr):
+        return 'secret', hashlib.sha256(obj.get_secret_value().encode()).hexdigest()
+    try:
+        hash(obj)
+    except TypeError:
+        return repr(obj)
+    return obj
+
+
+@lru_cache(maxsize=256)
+def _cfg_hash(frozen: Any) -> str:
+    # Objects without a value based repr (e.g. HTTP clients) are told apart by the identity in their repr
+    return hashlib.sha256(repr(frozen).encode()).hexdigest()
+
+
+def _client_key(model_name: ModelNames,
+                model_provider: LlmServers,
+                api_key: SecretStr,
+                model_args: dict[str, Any]) -> str:
+    return _cfg_hash(_freeze((model_provider.value, model_name.value, api_key, model_args)))
+
+
+# Response cache for identical prompts: unset (no caching), 'memory', or the path of an SQLite file
+LLM_CACHE_ENV_VAR: Final = 'AI_COMMON_LLM_CACHE'
+_IN_MEMORY_LLM_CACHE_SIZE: Final = 4096
+
+
+_NO_USAGE: Final = {'input_tokens': 0, 'output_tokens': 0, 'total_tokens': 0}
+
+
+def _without_usage(return_val: RETURN_VAL_TYPE) -> RETURN_VAL_TYPE:
+    # Cache hits cost no tokens, so their usage is zeroed (on copies, the cache keeps the original) instead of being
+    # counted again by the usage callbacks, as the summary cache of WebSearchNode does
+    return [
+        generation.model_copy(update={'message': generation.message.model_copy(update={'usage_metadata': _NO_USAGE})})
+        if isinstance(generation, ChatGeneration) and getattr(generation.message, 'usage_metadata', None)
+        else generation
+        for generation in return_val
+    ]
+
+
+class _InMemoryLlmCache(InMemoryCache):
+    def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        return_val = super().lookup(prompt, llm_string)
+        return None if return_val is None else _without_usage(return_val)
+
+
+class _DiskLlmCache(BaseCache):
+    # LangChain response cache on top of DiskCache, so that cached responses survive restarts
+    def __init__(self, path: str | os.PathLike):
+        self._cache = DiskCache(path=path, table='llm_cache')
+
+    def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        value = self._cache.get(DiskCache.make_key(prompt, llm_string))
+        if value is None:
+            return None
+        with suppress_langchain_beta_warning():
+            return _without_usage(loads(value, allowed_objects='core'))
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self._cache.set(DiskCache.make_key(prompt, llm_string), dumps(return_val))
+
+    def clear(self, **kwargs: Any) -> None:
+        self._cache.clear()
+
+
+@lru_cache(maxsize=1)
+def _get_llm_cache() -> BaseCache | None:
+    setting = os.environ.get(LLM_CACHE_ENV_VAR, '').strip()
+    if not setting:
+        return None
+    if setting == 'memory':
+        return _InMemoryLlmCache(maxsize=_IN_MEMORY_LLM_CACHE_SIZE)
+    return _DiskLlmCache(path=setting)
+
+
 def get_llm(model_name: ModelNames,
             model_provider: LlmServers,
             api_key: SecretStr,
-            model_args: dict[str, Any]) -> BaseChatModel:
+            model_args: dict[str, Any],
+            use_cached_client: bool = True) -> BaseChatModel:
+    """
+    Create the chat model of the given provider.
+
+    With use_cached_client (the default), models are shared process-wide among calls with the same model, provider,
+    API key and model arguments, so agents built with the same settings reuse one set of HTTP connections.
+    model_args is not modified.
+
+    model_args may also hold enable_prompt_cache (default True), which turns on prompt caching for Anthropic models.
+    If the AI_COMMON_LLM_CACHE environment variable is set ('memory' or an SQLite file path), responses to identical
+    prompts with identical model settings are served from that cache, unless model_args sets cache itself.
+    """
+    if not use_cached_client:
+        llm, _ = _create_llm(model_name=model_name, model_provider=model_provider, api_key=api_key,
+                             model_args=dict(model_args))
+        return llm
+
+    key = _client_key(model_name=model_name, model_provider=model_provider, api_key=api_key, model_args=model_args)
+    entry = _CLIENT_CACHE.get(key)
+    if entry is not None:
+        _CLIENT_CACHE.move_to_end(key)
+        return entry[0]
+
+    llm, http_resources = _create_llm(model_name=model_name, model_provider=model_provider, api_key=api_key,
+                                      model_args=dict(model_args))
+    _CLIENT_CACHE[key] = (llm, http_resources)
+    if len(_CLIENT_CACHE) > _CLIENT_CACHE_SIZE:
+        _CLIENT_CACHE.popitem(last=False)
+    return llm
+
+
+def close_cached_llms() -> None:
+    """
+    Empty the pool of chat models shared by get_llm, and close the HTTP clients that were created for them.
+
+    Models obtained from get_llm before must not be used afterwards; later get_llm calls create new ones. HTTP clients
+    passed in through model_args belong to the caller and are left open. The async connection pools are bound to
+    their event loops, so they are dropped rather than closed.
+    """
+    while _CLIENT_CACHE:
+        _, (_, http_resources) = _CLIENT_CACHE.popitem(last=False)
+        for http_resource in http_resources:
+            http_resource.close()
+
+
+def _create_llm(model_name: ModelNames,
+                model_provider: LlmServers,
+                api_key: SecretStr,
+                model_args: dict[str, Any]) -> tuple[BaseChatModel, tuple[_HttpResource, ...]]:
 
-    # model_name_str = MODEL_NAME_ALIAS_DICT[model_name.value][model_provider.value] if model_name.value in MODEL_NAME_ALIAS_DICT.keys() else model_name.value
     model_name_str = get_model_name_alias(model_name=model_name, model_provider=model_provider)
 
-    llm = None
-    match model_provider:
-        case LlmServers.ANTHROPIC:
-            llm = ChatAnthropic(
-                model_name = model_name_str,
-                api_key = api_key,
-                stop = None,
-                timeout = None,
-                **model_args,
-            )
-        case LlmServers.GOOGLE:
-            # https://ai.google.dev/gemini-api/docs/gemini-3#temperature
-            if ('temperature' in model_args.keys()) and (model_name_str.startswith('gemini-3')):
-                model_args['temperature'] = 1.0
-
-            if ('reasoning' in model_args.keys()) and ('thinking_level' not in model_args.keys()):
-                model_args['thinking_level'] = model_args.pop('reasoning')
-            if ('reasoning_effort' in model_args.keys()) and ('thinking_level' not in model_args.keys()):
-                model_args['thinking_level'] = model_args.pop('reasoning_effort')
-
-            llm = ChatGoogleGenerativeAI(
-                model = model_name_str,
-                api_key = api_key,
-                max_tokens=None,
-                timeout=None,
-                **model_args,
-            )
-        case LlmServers.GROQ:
-            if 'top_p' in model_args.keys():
-                model_args['model_kwargs'] = {
-                    'top_p': model_args.pop('top_p')
-                }
-            if ('reasoning' in model_args.keys()) and ('reasoning_effort' not in model_args.keys()):
-                model_args['reasoning_effort'] = model_args.pop('reasoning')
-
-            llm = ChatGroq(
-                model = model_name_str,
-                api_key = api_key,
-                service_tier = "auto",
-                **model_args,
-            )
-        case LlmServers.OPENAI:
-
-            if ('reasoning' not in model_args.keys()) and ('reasoning_effort' in model_args.keys()):
-                model_args['reasoning'] = {
-                    'effort': model_args.pop('reasoning_effort'),
-                    'summary': 'auto',
-                }
-
-            if model_args['reasoning']['effort'] != 'none':
-                _ = model_args.pop('top_p', 'N/A')
-                _ = model_args.pop('temperature', 'N/A')
-                _ = model_args.pop('logprobs', 'N/A')
-
-            llm = ChatOpenAI(
-                model = model_name_str,
-                api_key = api_key,
-                use_responses_api = True,
-                **model_args,
-            )
-        case LlmServers.OLLAMA:
-
-            if ('reasoning' not in model_args.keys()) and ('reasoning_effort' in model_args.keys()):
-                model_args['reasoning'] = model_args.pop('reasoning_effort')
-
-            llm = ChatOllama(
-                model = model_name_str,
-                client_kwargs={
-                    'headers': {'Authorization': f'Bearer {api_key.get_secret_value()}'}
-                },
-                base_url = "https://ollama.com",
-                **model_args,
-            )
-        case LlmServers.VLLM:
+    # Only Anthropic needs explicit cache breakpoints, the other providers cache long prompts on their own
+    enable_prompt_cache = model_args.pop('enable_prompt_cache', True)
+    if (llm_cache := _get_llm_cache()) is not None:
+        model_args.setdefault('cache', llm_cache)
+
+    builder = _PROVIDER_BUILDERS.get(model_provider)
+    if builder is None:
+        if model_provider == LlmServers.VLLM:
             # client = OpenAI(base_url=f'{llm_base_url}/v1', api_key=model_params['vllm_api_key'])
             # max_model_len = client.models.list().data[0].model_extra['max_model_len']  # Keep this
             # llm = ChatOpenAI(api_key=model_params['vllm_api_key'],
@@ -149,6 +310,153 @@ def get_llm(model_name: ModelNames,
             #                 temperature=0,
             #                 base_url=f'{llm_base_url}/v1')
             raise NotImplementedError(f'LLM Server {model_provider.value} is not yet implemented!')
-        case _:
-            raise ValueError(f'LLM Server {model_provider.value} is currently not supported!')
-    return llm
+        raise ValueError(f'LLM Server {model_provider.value} is currently not supported!')
+    return builder(model_name_str, api_key, model_args, enable_prompt_cache)
+
+
+# Marks an absent model argument, since None may be a meaningful value
+_MISSING: Final = object()
+
+# Provider builders take the provider's name of the model, the API key, a private copy of model_args (which they
+# adapt to the provider's conventions) and whether prompt caching is wanted, and return the chat model together with
+# the HTTP clients and transports they created for it (and which are closed with it).
+
+def _build_anthropic(model_name: str, api_key: SecretStr, model_args: dict[str, Any],
+                     enable_prompt_cache: bool) -> tuple[BaseChatModel, tuple[_HttpResource, ...]]:
+    ChatAnthropic = _get_provider_class(LlmServers.ANTHROPIC)
+    if enable_prompt_cache:
+        # Top-level cache_control lets the API place the breakpoint on the last cacheable block,
+        # so repeated calls with the same long system prompt are billed and served from the cache
+        model_kwargs = dict(model_args.pop('model_kwargs', {}))
+        model_kwargs.setdefault('cache_control', {'type': 'ephemeral'})
+        model_args['model_kwargs'] = model_kwargs
+    # The integration takes no HTTP clients; it shares process-wide SDK clients (with the SDK's connection limits)
+    llm = ChatAnthropic(
+        model_name = model_name,
+        api_key = api_key,
+        stop = None,
+        timeout = None,
+        **model_args,
+    )
+    return llm, ()
+
+
+def _build_google(model_name: str, api_key: SecretStr, model_args: dict[str, Any],
+                  enable_prompt_cache: bool) -> tuple[BaseChatModel, tuple[_HttpResource, ...]]:
+    ChatGoogleGenerativeAI = _get_provider_class(LlmServers.GOOGLE)
+    # https://ai.google.dev/gemini-api/docs/gemini-3#temperature
+    if ('temperature' in model_args.keys()) and (model_name.startswith('gemini-3')):
+        model_args['temperature'] = 1.0
+
+    if ('reasoning' in model_args.keys()) and ('thinking_level' not in model_args.keys()):
+        model_args['thinking_level'] = model_args.pop('reasoning')
+    if ('reasoning_effort' in model_args.keys()) and ('thinking_level' not in model_args.keys()):
+        model_args['thinking_level'] = model_args.pop('reasoning_effort')
+
+    # The SDK builds its sync and async httpx clients itself from the same client_args
+    model_args['client_args'] = {'limits': _SDK_HTTPX_LIMITS, **(model_args.get('client_args') or {})}
+
+    llm = ChatGoogleGenerativeAI(
+        model = model_name,
+        api_key = api_key,
+        max_tokens=None,
+        timeout=None,
+        **model_args,
+    )
+    return llm, ()
+
+
+def _build_groq(model_name: str, api_key: SecretStr, model_args: dict[str, Any],
+                enable_prompt_cache: bool) -> tuple[BaseChatModel, tuple[_HttpResource, ...]]:
+    ChatGroq = _get_provider_class(LlmServers.GROQ)
+    if (top_p := model_args.pop('top_p', _MISSING)) is not _MISSING:
+        # Merged into (not replacing) any model_kwargs given by the caller
+        model_args['model_kwargs'] = {**model_args.get('model_kwargs', {}), 'top_p': top_p}
+    if 'reasoning_effort' not in model_args and (reasoning := model_args.pop('reasoning', _MISSING)) is not _MISSING:
+        model_args['reasoning_effort'] = reasoning
+
+    http_resources = _add_http_clients(model_args)
+
+    llm = ChatGroq(
+        model = model_name,
+        api_key = api_key,
+        service_tier = "auto",
+        **model_args,
+    )
+    return llm, http_resources
+
+
+def _build_openai(model_name: str, api_key: SecretStr, model_args: dict[str, Any],
+                  enable_prompt_cache: bool) -> tuple[BaseChatModel, tuple[_HttpResource, ...]]:
+    ChatOpenAI = _get_provider_class(LlmServers.OPENAI)
+
+    if ('reasoning' not in model_args.keys()) and ('reasoning_effort' in model_args.keys()):
+        model_args['reasoning'] = {
+            'effort': model_args.pop('reasoning_effort'),
+            'summary': 'auto',
+        }
+
+    if model_args['reasoning']['effort'] != 'none':
+        _ = model_args.pop('top_p', 'N/A')
+        _ = model_args.pop('temperature', 'N/A')
+        _ = model_args.pop('logprobs', 'N/A')
+
+    http_resources = _add_http_clients(model_args)
+
+    llm = ChatOpenAI(
+        model = model_name,
+        api_key = api_key,
+        use_responses_api = True,
+        **model_args,
+    )
+    return llm, http_resources
+
+
+def _build_ollama(model_name: str, api_key: SecretStr, model_args: dict[str, Any],
+                  enable_prompt_cache: bool) -> tuple[BaseChatModel, tuple[_HttpResource, ...]]:
+    ChatOllama = _get_provider_class(LlmServers.OLLAMA)
+
+    if 'reasoning' not in model_args and (effort := model_args.pop('reasoning_effort', _MISSING)) is not _MISSING:
+        model_args['reasoning'] = effort
+
+    # The ollama clients build their httpx clients themselves, so they are given transports created here instead
+    http_resources = []
+    for kwargs_name, new_transport in (('sync_client_kwargs', _ClientTransport),
+                                       ('async_client_kwargs', _LoopLocalAsyncTransport)):
+        client_kwargs = dict(model_args.get(kwargs_name) or {})
+        if 'transport' not in client_kwargs:
+            client_kwargs['transport'] = new_transport(limits=_HTTPX_LIMITS)
+            http_resources.append(client_kwargs['transport'])
+        model_args[kwargs_name] = client_kwargs
+
+    llm = ChatOllama(
+        model = model_name,
+        client_kwargs={'headers': {'Authorization': f'Bearer {api_key.get_secret_value()}'}},
+        base_url = "https://ollama.com",
+        **model_args,
+    )
+    return llm, tuple(http_resources)
+
+
+def _add_http_clients(model_args: dict[str, Any]) -> tuple[_HttpResource, ...]:
+    # Sync and async HTTP clients for the SDKs that take them (http_client, http_async_client), unless given by the
+    # caller. Returns what was created here.
+    http_resources = []
+    if 'http_client' not in model_args:
+        model_args['http_client'] = httpx.Client(limits=_HTTPX_LIMITS)
+        http_resources.append(model_args['http_client'])
+    if 'http_async_client' not in model_args:
+        transport = _LoopLocalAsyncTransport(limits=_HTTPX_LIMITS)
+        model_args['http_async_client'] = httpx.AsyncClient(transport=transport)
+        http_resources.append(transport)
+    return tuple(http_resources)
+
+
+_PROVIDER_BUILDERS: dict[LlmServers, Callable[[str, SecretStr, dict[str, Any], bool],
+                                               tuple[BaseChatModel, tuple[_HttpResource, ...]]]] = {
+    LlmServers.ANTHROPIC: _build_anthropic,
+    LlmServers.GOOGLE: _build_google,
+    LlmServers.GROQ: _build_groq,
+    LlmServers.OPENAI: _build_openai,
+    LlmServers.OLLAMA: _build_ollama,
+}
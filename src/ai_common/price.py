@@ -1,3 +1,5 @@
+import math
+from enum import Enum
 from typing import Any
 
 from .enums import LlmServers, ModelNames
@@ -6,7 +8,7 @@ PRICE_USD_PER_MILLION_TOKENS = {
     LlmServers.GOOGLE: {
         ModelNames.GEMINI_3_FLASH_PREVIEW: {'input_tokens': 0.50, 'output_tokens': 3.00},
         ModelNames.GEMINI_3_1_PRO_PREVIEW: {'input_tokens': 2.00, 'output_tokens': 12.00},
-        ModelNames.GEMINI_3_1_FLASH_LITE_PREVIEW: {'input_tokens': 0.25, 'output_tokens': 1.50},
+        ModelNames.GEMINI_3_1_FLASH_LITE: {'input_tokens': 0.25, 'output_tokens': 1.50},
     },
     LlmServers.GROQ: {
         ModelNames.GPT_OSS_120B: {'input_tokens': 0.15, 'output_tokens': 0.75},
@@ -38,11 +40,26 @@ PRICE_USD_PER_MILLION_TOKENS = {
 }
 
 
+def _normalize_key(key: Enum | str) -> str:
+    # The table mixes enum members and plain model name strings (e.g. Anthropic), and so may callers
+    return key.value if isinstance(key, Enum) else key
+
+
+# (provider, model) -> (input price, output price) in USD per token, built once from the table above.
+# Keys are normalized to strings, so that enum members and their values find the same entry.
+_FLAT_PRICES: dict[tuple[str, str], tuple[float, float]] = {
+    (_normalize_key(provider), _normalize_key(model)): (prices['input_tokens'] * 1e-6, prices['output_tokens'] * 1e-6)
+    for provider, models in PRICE_USD_PER_MILLION_TOKENS.items()
+    for model, prices in models.items()
+}
+
+
 def calculate_token_cost_for_one_model(params: dict[str, Any], token_usage: dict[str, Any]) -> dict[str, Any]:
     model_provider = params['model_provider']
     model = params['model']
-    price_dict = PRICE_USD_PER_MILLION_TOKENS[model_provider][model]
-    cost = sum([price_dict[k] * token_usage[model][k] for k in price_dict.keys()]) / 1e6
+    input_price, output_price = _FLAT_PRICES[(_normalize_key(model_provider), _normalize_key(model))]
+    usage = token_usage[model]
+    cost = input_price * usage['input_tokens'] + output_price * usage['output_tokens']
     return {
         'model_provider': model_provider,
         'model': model,
@@ -50,10 +67,7 @@ def calculate_token_cost_for_one_model(params: dict[str, Any], token_usage: dict
     }
 
 def calculate_token_cost(llm_config: dict[str, Any], token_usage: dict[str, Any]) -> tuple[list[dict[str, Any]], float]:
-    total_cost = 0
-    cost_list = []
-    for model_type, params in llm_config.items():
-        cost_dict = calculate_token_cost_for_one_model(params = params, token_usage = token_usage)
-        total_cost += cost_dict['cost']
-        cost_list.append(cost_dict)
+    cost_list = [calculate_token_cost_for_one_model(params = params, token_usage = token_usage)
+                 for params in llm_config.values()]
+    total_cost = math.fsum(cost_dict['cost'] for cost_dict in cost_list)
     return cost_list, total_cost
@@ -1,11 +1,41 @@
+import time
+from functools import lru_cache
+from typing import Final
+
 from ollama import ListResponse, Client
 from tqdm import tqdm
 
+# Installed model lists are reused for this long; an older list is still served if refreshing it fails
+_MODEL_LIST_TTL_SECONDS: Final = 5.0
+_model_list_cache: dict[str, tuple[float, set[str]]] = {}
+_PROGRESS_MIN_INTERVAL_SECONDS: Final = 0.5
+_PROGRESS_MIN_BYTES: Final = 1 << 20
+
+
+@lru_cache(maxsize=8)
+def _get_ollama_client(ollama_url: str) -> Client:
+    # One client per server, so that its HTTP connections are kept alive between calls
+    return Client(host=ollama_url)
+
+
+def _get_available_model_names(ollama_url: str) -> set[str]:
+    cached = _model_list_cache.get(ollama_url)
+    if cached is not None and time.monotonic() - cached[0] < _MODEL_LIST_TTL_SECONDS:
+        return cached[1]
+    try:
+        response: ListResponse = _get_ollama_client(ollama_url).list()
+    except Exception:
+        if cached is None:
+            raise
+        return cached[1]
+    available_model_names = {x.model for x in response.models}
+    _model_list_cache[ollama_url] = (time.monotonic(), available_model_names)
+    return available_model_names
+
 
 def _check_and_pull_ollama_model(model_name: str, ollama_url: str) -> None:
-    ollama_client = Client(host=ollama_url)
-    response: ListResponse = ollama_client.list()
-    available_model_names = [x.model for x in response.models]
+    ollama_client = _get_ollama_client(ollama_url)
+    available_model_names = _get_available_model_names(ollama_url)
 
     # Modified from https://github.com/ollama/ollama-python/blob/main/examples/pull.py
     if model_name not in available_model_names:
@@ -21,9 +51,14 @@ def _check_and_pull_ollama_model(model_name: str, ollama_url: str) -> None:
                 continue
 
             if digest not in bars and (total := progress.get('total')):
-                bars[digest] = tqdm(total=total, desc=f'pulling {digest[7:19]}', unit='B', unit_scale=True)
+                # Redraw at most twice a second and once per MiB, multi-GB pulls report progress thousands of times
+                bars[digest] = tqdm(total=total, desc=f'pulling {digest[7:19]}', unit='B', unit_scale=True,
+                                    mininterval=_PROGRESS_MIN_INTERVAL_SECONDS, miniters=_PROGRESS_MIN_BYTES,
+                                    smoothing=0.1)
 
             if completed := progress.get('completed'):
                 bars[digest].update(completed - bars[digest].n)
 
             current_digest = digest
+
+        available_model_names.add(model_name)
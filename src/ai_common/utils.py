@@ -1,27 +1,218 @@
 import asyncio
+from collections import OrderedDict
 import datetime
-from io import BytesIO
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache, partial
+import hashlib
+from io import BytesIO, StringIO
 import importlib
+from itertools import chain, islice
+import logging
+import re
+import string
+import time
+from typing import (Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Coroutine, Final, Iterable, Iterator,
+                    Mapping, TYPE_CHECKING, TypeVar)
+from urllib.parse import urlsplit, urlunsplit
 
 from PIL import Image
 from tavily import AsyncTavilyClient
 from langchain_core.runnables import RunnableConfig
 
+if TYPE_CHECKING:
+    import tiktoken
+
 from .base import CfgBase
+from .cache import DiskCache
 from .enums import TavilySearchCategory, TavilySearchDepth
 
 
+logger = logging.getLogger(__name__)
+
+_T = TypeVar('_T')
+
+_TODAY: ContextVar[str] = ContextVar('today')
+# Each <think> block up to its first closing tag, like the original find/slice loop
+_THINKING_TOKENS_PATTERN: Final = re.compile(r'<think>.*?</think>', re.DOTALL)
+# Query parameters that only track the referrer, besides the utm_* family
+_TRACKING_PARAMETERS: Final = frozenset({'gclid', 'fbclid'})
+# Length of the content prefix compared when detecting the same article under different URLs
+_CONTENT_DIGEST_CHARS: Final = 4096
+# Default cap on concurrent Tavily searches of one call (or of one WebSearch instance)
+TAVILY_MAX_IN_FLIGHT: Final = 16
+# Default time limit of a single Tavily search, below the client's own 60s request timeout
+_TAVILY_SEARCH_TIMEOUT_SECONDS: Final = 30.0
+# Earliest start_date passed to Tavily searches
+_TAVILY_MIN_START_DATE: Final = datetime.date(1919, 5, 19)
+# Characters per token of most real text, so that a prefix of max_tokens * 8 characters is usually enough to find
+# where max_tokens tokens end. Texts with longer tokens (e.g. URLs, long identifiers, runs of whitespace) are encoded
+# whole instead.
+_MAX_CHARS_PER_TOKEN: Final = 8
+# Number of long raw contents from which they are tokenized on several threads
+_PARALLEL_ENCODE_MIN_TEXTS: Final = 4
+# Tavily responses reused within the process (opt-in with cache_ttl), keyed by search options and normalized query.
+# Responses carry raw page contents, so the number of entries is kept small.
+_TAVILY_CACHE_MAX_ENTRIES: Final = 128
+_SEARCH_CACHE: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+_PENDING_SEARCHES: dict[str, asyncio.Future] = {}
+
+
 def get_config_from_runnable(configuration_module_prefix: str, config: RunnableConfig) -> CfgBase:
-    module = importlib.import_module(name=f'{configuration_module_prefix}')
-    class_ = getattr(module, 'Configuration')
+    class_ = _load_configuration_class(configuration_module_prefix)
     configurable = class_.from_runnable(runnable=config)
     return configurable
 
 
-def get_flow_chart(rag_model):
-    img_bytes = BytesIO(rag_model.graph.get_graph(xray=True).draw_mermaid_png())
-    img = Image.open(img_bytes).convert("RGB")
-    return img
+@lru_cache(maxsize=32)
+def _load_configuration_class(configuration_module_prefix: str) -> type[CfgBase]:
+    # Resolved once per module; graph nodes call get_config_from_runnable on every invocation
+    module = importlib.import_module(name=f'{configuration_module_prefix}')
+    return getattr(module, 'Configuration')
+
+
+def compile_prompt(template: str) -> Callable[..., str]:
+    """
+    Pre-parse a str.format style prompt template into its literal segments and field names.
+
+    The returned function renders the template from keyword arguments, equivalent to template.format(**kwargs),
+    but without re-parsing the (often multi-KB) format string on every call. Format specs and conversions
+    (e.g. {x:>10}, {x!r}) are not supported.
+
+    Args:
+        template (str): The prompt template, using {field} placeholders and {{ }} escapes.
+
+    Returns:
+        Callable[..., str]: A function that takes the template fields as keyword arguments and returns the rendered prompt.
+    """
+    segments = []
+    for literal_text, field_name, format_spec, conversion in string.Formatter().parse(template):
+        if format_spec or conversion:
+            raise ValueError(f'Format specs and conversions are not supported: {{{field_name}}}')
+        segments.append((literal_text, field_name))
+    segments = tuple(segments)
+
+    def render(**kwargs) -> str:
+        return ''.join([literal_text if field_name is None else f'{literal_text}{kwargs[field_name]}'
+                        for literal_text, field_name in segments])
+
+    return render
+
+
+def today_iso() -> str:
+    """
+    Today's date in ISO format.
+
+    Inside a freeze_today() block, every call returns the same date, which keeps the prompts of one request
+    consistent and avoids recomputing it. Outside such a block, the current date is returned.
+    """
+    today = _TODAY.get(None)
+    return today if today is not None else datetime.date.today().isoformat()
+
+
+@contextmanager
+def freeze_today() -> Iterator[str]:
+    """
+    Pin today_iso() to a single date for the duration of a request.
+
+    The date is stored in a context variable, so it is shared by the tasks and threads that inherit the
+    context of the request, and is reset when the block exits.
+
+    Example:
+        >>> with freeze_today():
+        ...     response = responder.get_response(input_dict=input_dict)
+    """
+    token = _TODAY.set(datetime.date.today().isoformat())
+    try:
+        yield _TODAY.get()
+    finally:
+        _TODAY.reset(token)
+
+
+def update_token_usage(token_usage: dict[str, int], usages: Iterable[Mapping[str, int]]) -> dict[str, int]:
+    """
+    Add the input and output token counts of several LLM calls to a token usage accumulator, in place.
+
+    Like Counter.update, the counts are added rather than replaced, and the accumulator may be a plain dict
+    or a collections.Counter. The usages are traversed once and the accumulator is written once per key.
+
+    Args:
+        token_usage (dict[str, int]): Accumulator with 'input_tokens' and 'output_tokens' counts (e.g. state.token_usage[model_name]).
+        usages (Iterable[Mapping[str, int]]): Token usages of individual LLM calls.
+
+    Returns:
+        dict[str, int]: The updated accumulator.
+    """
+    input_tokens = output_tokens = 0
+    for usage in usages:
+        input_tokens += usage['input_tokens']
+        output_tokens += usage['output_tokens']
+    token_usage['input_tokens'] += input_tokens
+    token_usage['output_tokens'] += output_tokens
+    return token_usage
+
+
+def get_token_usage(usage_metadata: Mapping[str, Mapping[str, int]], model_name_alias: str) -> dict[str, int]:
+    """
+    Input and output token counts of a model in the usage metadata collected by get_usage_metadata_callback.
+
+    The model entry is looked up once; a model without usage (e.g. no call was made) counts as zero tokens.
+    """
+    usage = usage_metadata.get(model_name_alias)
+    if usage is None:
+        return {'input_tokens': 0, 'output_tokens': 0}
+    return {'input_tokens': usage['input_tokens'], 'output_tokens': usage['output_tokens']}
+
+
+def run_sync(coroutine: Coroutine[Any, Any, _T]) -> _T:
+    """
+    Run a coroutine to completion in a new event loop, like asyncio.run.
+
+    The loop is a uvloop loop when uvloop is installed (pip install ai-common[uvloop], not available on Windows),
+    which schedules the many concurrent search and LLM tasks with less overhead than the default loop. Its tasks
+    start eagerly (asyncio.eager_task_factory), so each one runs up to its first await, e.g. sending its request,
+    without waiting for a scheduler round trip. The global event loop policy is left untouched.
+    """
+    return asyncio.run(coroutine, loop_factory=_new_event_loop)
+
+
+def _new_event_loop() -> asyncio.AbstractEventLoop:
+    loop = _get_new_event_loop()()
+    loop.set_task_factory(asyncio.eager_task_factory)
+    return loop
+
+
+@lru_cache(maxsize=1)
+def _get_new_event_loop() -> Callable[[], asyncio.AbstractEventLoop]:
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.new_event_loop
+    return uvloop.new_event_loop
+
+
+def get_flow_chart(rag_model, as_bytes: bool = False):
+    # as_bytes returns the rendered PNG as is, e.g. for saving or displaying it without decoding
+    png = _render_mermaid_png(rag_model.graph.get_graph(xray=True).draw_mermaid())
+    if as_bytes:
+        return png
+    # Callers may draw on the image, so each gets its own copy of the cached decoded one
+    return _decode_flow_chart(png).copy()
+
+
+@lru_cache(maxsize=8)
+def _decode_flow_chart(png: bytes) -> Image.Image:
+    # Keyed by the cached PNG bytes object, whose hash is computed once
+    img = Image.open(BytesIO(png), formats=['PNG'])
+    img.load()
+    return img if img.mode == 'RGB' else img.convert('RGB')
+
+
+@lru_cache(maxsize=8)
+def _render_mermaid_png(mermaid_syntax: str) -> bytes:
+    # Rendering goes through the mermaid.ink API, so an unchanged graph is rendered only once per process
+    from langchain_core.runnables.graph_mermaid import draw_mermaid_png
+    return draw_mermaid_png(mermaid_syntax=mermaid_syntax)
 
 
 async def tavily_search_async(client: AsyncTavilyClient,
@@ -33,7 +224,13 @@ async def tavily_search_async(client: AsyncTavilyClient,
                               max_results: int,
                               include_images: bool,
                               include_image_descriptions: bool,
-                              include_favicon: bool):
+                              include_favicon: bool,
+                              max_concurrency: int = TAVILY_MAX_IN_FLIGHT,
+                              requests_per_minute: int | None = None,
+                              search_timeout: float | None = _TAVILY_SEARCH_TIMEOUT_SECONDS,
+                              cache_ttl: float | None = None,
+                              search_cache: DiskCache | None = None,
+                              semaphore: asyncio.Semaphore | None = None):
     """
     Perform concurrent web searches using the Tavily API with comprehensive configuration options.
     
@@ -82,6 +279,25 @@ async def tavily_search_async(client: AsyncTavilyClient,
                                          Provides textual context for visual content.
         include_favicon (bool): Whether to include website favicons in the results.
                               Adds branding information for source identification.
+        max_concurrency (int): Maximum number of searches in flight at once (default 16).
+                             Further queries wait for a slot, which keeps long query lists within the
+                             connection pool and the API rate limits.
+        requests_per_minute (int | None): Maximum rate of searches sent to Tavily (default None, no limit).
+                                        The limit is shared by all calls with the same value in the process,
+                                        so concurrent graph runs together stay below the plan's rate limit
+                                        instead of running into 429 responses.
+        search_timeout (float | None): Time limit in seconds for each search (default 30, None for no limit).
+                                     A search that exceeds it is logged and returns an empty result list, so one
+                                     hung query does not hold back or fail the others.
+        cache_ttl (float | None): Seconds for which the response of a query (with the same search options) is
+                                reused within the process, e.g. 300 (default None, always search). Identical
+                                queries in flight at the same time then share one request. The cache is shared by
+                                all clients of the process, so enable it only where they use the same Tavily account.
+        search_cache (DiskCache | None): Persistent cache of search responses across processes (e.g. notebook reruns,
+                                       development loops). The key includes the start date, so a response is reused
+                                       on the day it was fetched. Timed out searches are not stored.
+        semaphore (asyncio.Semaphore | None): Caps the searches in flight instead of max_concurrency, to share one
+                                            cap among concurrent calls (e.g. of one WebSearch instance).
     
     Returns:
         List[dict]: A list of search result dictionaries, one per input query, preserving the order
@@ -127,7 +343,7 @@ async def tavily_search_async(client: AsyncTavilyClient,
         ...     print(f"Found {len(result['results'])} results")
     
     Performance Characteristics:
-        - Concurrent execution using asyncio.gather for optimal performance
+        - Concurrent execution using asyncio.gather, bounded by max_concurrency
         - Network I/O bound operations benefit from async processing
         - Memory usage scales with number of queries and max_results per query
         - Processing time depends on search_depth and API response times
@@ -143,6 +359,7 @@ async def tavily_search_async(client: AsyncTavilyClient,
         - For general searches, the time range is unrestricted regardless of number_of_days_back
         - All searches include raw content by default for comprehensive text analysis
         - The function preserves the order of input queries in the returned results
+        - Queries that differ only in case or surrounding whitespace are searched once and share their result
         - API usage and costs scale with the number of queries and max_results per query
     
     See Also:
@@ -151,10 +368,234 @@ async def tavily_search_async(client: AsyncTavilyClient,
         - format_sources: Function for formatting search results for display
     """
 
-    start_date = datetime.date.today() - datetime.timedelta(days=number_of_days_back)
-    start_date_str = start_date.isoformat() if start_date > datetime.date.fromisoformat("1919-05-19") else "1919-05-19"
+    kwargs = _tavily_search_kwargs(search_category=search_category,
+                                   search_depth=search_depth,
+                                   chunks_per_source=chunks_per_source,
+                                   number_of_days_back=number_of_days_back,
+                                   max_results=max_results,
+                                   include_images=include_images,
+                                   include_image_descriptions=include_image_descriptions,
+                                   include_favicon=include_favicon)
+
+    # Queries that differ only in case or surrounding whitespace are searched once
+    unique_queries, positions = _unique_search_queries(search_queries)
+
+    # Execute the searches concurrently, at most max_concurrency at a time
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max_concurrency)
+    rate_limiter = _get_rate_limiter(requests_per_minute) if requests_per_minute else None
+    search = partial(client.search, **kwargs)
+    options_key = repr(sorted(kwargs.items()))
+    search_tasks = [asyncio.create_task(_cached_search(search=search, semaphore=semaphore,
+                                                       rate_limiter=rate_limiter, query=query,
+                                                       timeout=search_timeout, options_key=options_key,
+                                                       cache_ttl=cache_ttl, search_cache=search_cache))
+                    for query in unique_queries]
+    try:
+        unique_docs = await asyncio.gather(*search_tasks)
+    except BaseException:
+        # Searches still running when one fails would otherwise be left behind unawaited
+        for task in search_tasks:
+            task.cancel()
+        raise
+    search_docs = [unique_docs[position] for position in positions]
+    return search_docs
+
+
+async def tavily_search_as_completed(client: AsyncTavilyClient,
+                                     search_queries: list[str],
+                                     search_category: TavilySearchCategory,
+                                     search_depth: TavilySearchDepth,
+                                     chunks_per_source: int,
+                                     number_of_days_back: int,
+                                     max_results: int,
+                                     include_images: bool,
+                                     include_image_descriptions: bool,
+                                     include_favicon: bool,
+                                     max_concurrency: int = TAVILY_MAX_IN_FLIGHT,
+                                     requests_per_minute: int | None = None,
+                                     search_timeout: float | None = _TAVILY_SEARCH_TIMEOUT_SECONDS,
+                                     cache_ttl: float | None = None,
+                                     search_cache: DiskCache | None = None,
+                                     semaphore: asyncio.Semaphore | None = None) -> AsyncIterator[dict]:
+    """
+    Run the searches of tavily_search_async concurrently, but yield each search response as soon as it arrives.
 
-    kwargs = {
+    Processing (e.g. deduplicate_sources_async) then overlaps with the searches still in flight, instead of
+    waiting for the slowest query. Responses come in completion order, not in the order of search_queries, and
+    there is one response per distinct query.
+    Searches that are still running when the consumer stops iterating are cancelled.
+    """
+    kwargs = _tavily_search_kwargs(search_category=search_category,
+                                   search_depth=search_depth,
+                                   chunks_per_source=chunks_per_source,
+                                   number_of_days_back=number_of_days_back,
+                                   max_results=max_results,
+                                   include_images=include_images,
+                                   include_image_descriptions=include_image_descriptions,
+                                   include_favicon=include_favicon)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max_concurrency)
+    rate_limiter = _get_rate_limiter(requests_per_minute) if requests_per_minute else None
+    unique_queries, _ = _unique_search_queries(search_queries)
+    search = partial(client.search, **kwargs)
+    options_key = repr(sorted(kwargs.items()))
+    search_tasks = [asyncio.create_task(_cached_search(search=search, semaphore=semaphore,
+                                                       rate_limiter=rate_limiter, query=query,
+                                                       timeout=search_timeout, options_key=options_key,
+                                                       cache_ttl=cache_ttl, search_cache=search_cache))
+                    for query in unique_queries]
+    try:
+        for next_done in asyncio.as_completed(search_tasks):
+            yield await next_done
+    finally:
+        for task in search_tasks:
+            task.cancel()
+
+
+def _unique_search_queries(search_queries: list[str]) -> tuple[list[str], list[int]]:
+    # Returns the first spelling of each distinct query, and for each input query the position of its distinct query
+    unique_positions: dict[str, int] = {}
+    unique_queries = []
+    positions = []
+    for query in search_queries:
+        key = query.strip().casefold()
+        position = unique_positions.get(key)
+        if position is None:
+            position = unique_positions[key] = len(unique_queries)
+            unique_queries.append(query)
+        positions.append(position)
+    return unique_queries, positions
+
+
+async def _cached_search(search: Callable[..., Awaitable[dict]],
+                         semaphore: asyncio.Semaphore,
+                         rate_limiter: '_RateLimiter | None',
+                         query: str,
+                         timeout: float | None,
+                         options_key: str,
+                         cache_ttl: float | None,
+                         search_cache: DiskCache | None) -> dict:
+    try:
+        if not cache_ttl and search_cache is None:
+            return await _bounded_search(search=search, semaphore=semaphore, rate_limiter=rate_limiter,
+                                         query=query, timeout=timeout)
+
+        cache_key = DiskCache.make_key(options_key, query.strip().casefold())
+        while True:
+            entry = _SEARCH_CACHE.get(cache_key) if cache_ttl else None
+            if entry is not None and time.monotonic() - entry[0] < cache_ttl:
+                _SEARCH_CACHE.move_to_end(cache_key)
+                return _copy_search_response(entry[1])
+
+            # Single flight: concurrent identical searches (e.g. from parallel graph runs) wait for one request. It is
+            # cancelled together with the caller that started it, the other callers then search again themselves.
+            pending = _PENDING_SEARCHES.get(cache_key)
+            is_leader = pending is None or pending.get_loop() is not asyncio.get_running_loop()
+            if is_leader:
+                pending = asyncio.ensure_future(_search_and_cache(search=search, semaphore=semaphore,
+                                                                  rate_limiter=rate_limiter, query=query,
+                                                                  timeout=timeout, cache_key=cache_key,
+                                                                  cache_ttl=cache_ttl, search_cache=search_cache))
+                _PENDING_SEARCHES[cache_key] = pending
+                pending.add_done_callback(partial(_forget_pending_search, cache_key))
+            try:
+                response = await (pending if is_leader else asyncio.shield(pending))
+            except asyncio.CancelledError:
+                if is_leader or not pending.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                continue
+            return _copy_search_response(response)
+    except TimeoutError:
+        logger.warning('Tavily search timed out after %ss, continuing without its results: %r', timeout, query)
+        return {'query': query, 'results': []}
+
+
+async def _search_and_cache(search: Callable[..., Awaitable[dict]],
+                            semaphore: asyncio.Semaphore,
+                            rate_limiter: '_RateLimiter | None',
+                            query: str,
+                            timeout: float | None,
+                            cache_key: str,
+                            cache_ttl: float | None,
+                            search_cache: DiskCache | None) -> dict:
+    response = None if search_cache is None else await search_cache.aget(cache_key)
+    if response is None:
+        response = await _bounded_search(search=search, semaphore=semaphore, rate_limiter=rate_limiter,
+                                         query=query, timeout=timeout)
+        if search_cache is not None:
+            await search_cache.aset(cache_key, response)
+    if cache_ttl:
+        _SEARCH_CACHE[cache_key] = (time.monotonic(), response)
+        _SEARCH_CACHE.move_to_end(cache_key)
+        if len(_SEARCH_CACHE) > _TAVILY_CACHE_MAX_ENTRIES:
+            _SEARCH_CACHE.popitem(last=False)
+    return response
+
+
+def _forget_pending_search(cache_key: str, pending: asyncio.Future) -> None:
+    if _PENDING_SEARCHES.get(cache_key) is pending:
+        del _PENDING_SEARCHES[cache_key]
+
+
+def _copy_search_response(response: dict) -> dict:
+    # Callers update the result dicts in place (e.g. WebSearchNode replaces their content), so cached responses
+    # are handed out as copies
+    return {**response, 'results': [dict(result) for result in response.get('results', [])]}
+
+
+async def _bounded_search(search: Callable[..., Awaitable[dict]],
+                          semaphore: asyncio.Semaphore,
+                          rate_limiter: '_RateLimiter | None',
+                          query: str,
+                          timeout: float | None) -> dict:
+    # search is client.search with the shared search options bound once per call of the public functions
+    async with semaphore:
+        if rate_limiter is not None:
+            await rate_limiter.acquire()
+        async with asyncio.timeout(timeout):
+            return await search(query=query)
+
+
+class _RateLimiter:
+    """
+    Token bucket spacing requests evenly at the given rate, with a burst of up to one second worth of requests.
+
+    It only reads the clock and sleeps, so it holds no event loop state and can be shared across loops.
+    """
+    def __init__(self, requests_per_minute: int):
+        self._interval = 60.0 / requests_per_minute
+        self._burst_window = max(self._interval, 1.0)
+        self._next_free = 0.0  # Time at which the bucket is full again
+
+    async def acquire(self) -> None:
+        now = time.monotonic()
+        # Reserve the slot before sleeping, so that concurrent callers queue up behind each other
+        self._next_free = max(self._next_free, now) + self._interval
+        delay = self._next_free - self._burst_window - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+@lru_cache(maxsize=8)
+def _get_rate_limiter(requests_per_minute: int) -> _RateLimiter:
+    return _RateLimiter(requests_per_minute=requests_per_minute)
+
+
+def _tavily_search_kwargs(search_category: TavilySearchCategory,
+                          search_depth: TavilySearchDepth,
+                          chunks_per_source: int,
+                          number_of_days_back: int,
+                          max_results: int,
+                          include_images: bool,
+                          include_image_descriptions: bool,
+                          include_favicon: bool) -> dict:
+    today = datetime.date.today()
+    # Capping the days at the earliest start date also keeps a huge number_of_days_back from overflowing date
+    days_back = min(number_of_days_back, (today - _TAVILY_MIN_START_DATE).days)
+    start_date_str = (today - datetime.timedelta(days=days_back)).isoformat()
+
+    return {
         'max_results': max_results,
         'include_raw_content': True,
         'topic': search_category.value,
@@ -166,11 +607,6 @@ async def tavily_search_async(client: AsyncTavilyClient,
         'start_date': start_date_str,
     }
 
-    # Execute all searches concurrently
-    search_tasks = [client.search(query=query, **kwargs) for query in search_queries]
-    search_docs = await asyncio.gather(*search_tasks)
-    return search_docs
-
 
 def deduplicate_sources(search_response: list[dict]):
     """
@@ -241,13 +677,16 @@ def deduplicate_sources(search_response: list[dict]):
     Processing Logic:
         1. Iterate through each search response in the input list
         2. Check if the response is a dictionary with a 'results' key
-        3. If yes, extract the results list; otherwise, treat the response as a direct list
-        4. Extend the sources list with all extracted results
-        5. Create a dictionary using URLs as keys to automatically eliminate duplicates
+        3. If yes, take its results list; otherwise, treat the response as a direct list
+        4. Chain the results of all responses lazily, without building an intermediate list
+        5. In the same pass, add each source whose URL (and content) was not seen before to the dictionary
         6. Return the deduplicated dictionary of unique sources
     
     Note:
         - The function preserves the first occurrence of each URL encountered
+        - URLs are compared in canonical form (see canonicalize_url), so e.g. http/https, host case, trailing
+          slash and tracking parameter variants of a page count as one source, kept under its first URL
+        - Sources whose content matches an earlier source (e.g. a syndicated article on another host) are dropped
         - Source dictionaries must contain a 'url' key for proper deduplication
         - The function is tolerant of different response formats from the Tavily API
         - Memory usage is proportional to the number of unique sources found
@@ -258,54 +697,211 @@ def deduplicate_sources(search_response: list[dict]):
         - format_sources: Function that formats the deduplicated sources for display
         - deduplicate_and_format_sources: Convenience function that combines deduplication and formatting
     """
-    sources_list = []
-    for response in search_response:
-        if isinstance(response, dict) and 'results' in response:
-            sources_list.extend(response['results'])
-        else:
-            sources_list.extend(response)
+    # Deduplicate by canonical URL in a single pass over the flattened results, keeping the first occurrence
+    unique_sources = {}
+    _add_unique_sources(unique_sources=unique_sources,
+                        seen=set(),
+                        sources=chain.from_iterable(map(_response_results, search_response)))
+
+    return unique_sources
 
-    # Deduplicate by URL
+
+async def deduplicate_sources_async(search_response: AsyncIterable[dict], max_sources: int | None = None) -> dict:
+    """
+    deduplicate_sources for responses that arrive over time, e.g. from tavily_search_as_completed.
+
+    Each response is merged as soon as it arrives. The first occurrence of a URL in arrival order is kept.
+    With max_sources, merging stops once that many unique sources are collected, and search_response is closed,
+    which for tavily_search_as_completed cancels the searches still in flight.
+    """
     unique_sources = {}
-    for source in sources_list:
-        if source['url'] not in unique_sources:
-            unique_sources[source['url']] = source
+    seen = set()
+    async for response in search_response:
+        sources = _iter_unique_sources(seen=seen, sources=_response_results(response))
+        if max_sources is None:
+            unique_sources.update(sources)
+            continue
+        unique_sources.update(islice(sources, max_sources - len(unique_sources)))
+        if len(unique_sources) >= max_sources:
+            aclose = getattr(search_response, 'aclose', None)
+            if aclose is not None:
+                await aclose()
+            break
 
     return unique_sources
 
 
-def format_sources(unique_sources: dict,
+def unique_urls(search_response: list[dict]) -> list[str]:
+    """
+    The distinct source URLs of search responses, for callers that need no other source fields (e.g. logging).
+
+    URLs are compared in canonical form like in deduplicate_sources, and the first spelling is kept. Unlike
+    deduplicate_sources, sources are not compared by content, so no source dicts or content digests are retained.
+    """
+    urls: dict[str, str] = {}
+    for source in chain.from_iterable(map(_response_results, search_response)):
+        url = source['url']
+        urls.setdefault(canonicalize_url(url), url)
+    return list(urls.values())
+
+
+def _add_unique_sources(unique_sources: dict, seen: set[str | bytes], sources: Iterable[dict]) -> None:
+    unique_sources.update(_iter_unique_sources(seen=seen, sources=sources))
+
+
+def _iter_unique_sources(seen: set[str | bytes], sources: Iterable[dict]) -> Iterator[tuple[str, dict]]:
+    # Yields (url, source) for each source not seen before. seen holds the canonical URLs (str) and content digests
+    # (bytes) of the sources yielded so far, so that syndicated copies of an article on other hosts are dropped too.
+    for source in sources:
+        url = source['url']
+        key = canonicalize_url(url)
+        if key in seen:
+            continue
+        content_key = _content_digest(source.get('content'))
+        if content_key is not None:
+            if content_key in seen:
+                continue
+            seen.add(content_key)
+        seen.add(key)
+        yield url, source
+
+
+def _content_digest(content: str | None) -> bytes | None:
+    # Digest of the whitespace normalized beginning of the content; None for empty content, which identifies nothing
+    if not content:
+        return None
+    normalized = ' '.join(content[:_CONTENT_DIGEST_CHARS].split())
+    if not normalized:
+        return None
+    return hashlib.blake2b(normalized.encode(), digest_size=8).digest()
+
+
+@lru_cache(maxsize=4096)
+def canonicalize_url(url: str) -> str:
+    """
+    Canonical form of a URL, under which variants of the same page compare equal.
+
+    The scheme (http or https) and the fragment are dropped, the host is lowercased, trailing slashes of the path
+    are removed and tracking parameters (utm_*, gclid, fbclid) are removed from the query. URLs that cannot be
+    parsed are returned unchanged.
+    """
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    query = '&'.join(param for param in parts.query.split('&')
+                     if param and not _is_tracking_parameter(param.split('=', 1)[0]))
+    return urlunsplit(('', parts.netloc.lower(), parts.path.rstrip('/') or '/', query, ''))
+
+
+def _is_tracking_parameter(name: str) -> bool:
+    return name.startswith('utm_') or name in _TRACKING_PARAMETERS
+
+
+def _response_results(response: dict | list[dict]) -> list[dict]:
+    # A Tavily response dict, or directly a list of its results. Response dicts are by far the common case, so the
+    # lookup is just tried (a list raises TypeError) instead of checking the type and the key first.
+    try:
+        return response['results']
+    except (KeyError, TypeError):
+        return response
+
+
+def format_sources(unique_sources: Mapping[str, dict] | Iterable[tuple[str, dict]],
                    max_tokens_per_source: int = 5000,
-                   include_raw_content: bool = True) -> str:
+                   include_raw_content: bool = True,
+                   out: StringIO | None = None,
+                   token_encoding: str | None = None) -> str:
+    # unique_sources is either a {url: source} mapping or an iterable of (url, source) pairs, e.g. a generator.
+    # The text is written piecewise to out (a new buffer by default), and the whole buffer is returned.
+    # token_encoding names a tiktoken encoding (e.g. 'cl100k_base') to cut raw_content at exactly
+    # max_tokens_per_source tokens; by default the limit is estimated as 4 characters per token, which needs no
+    # tokenizer (tiktoken downloads an encoding on its first use).
+    if out is None:
+        out = StringIO()
+    write = out.write
+
+    # Using rough estimate of 4 characters per token
+    char_limit = max_tokens_per_source * 4
+    encoding = None if token_encoding is None else _get_token_encoding(token_encoding)
+    items = unique_sources.items() if isinstance(unique_sources, Mapping) else unique_sources
+    if encoding is not None and include_raw_content:
+        # All raw contents are tokenized up front in one batch
+        items = list(items)
+        raw_contents = [source.get('raw_content') or '' for _, source in items]
+        truncated_raw_contents = iter(_truncate_to_tokens(texts=raw_contents,
+                                                          encoding=encoding,
+                                                          max_tokens=max_tokens_per_source))
+    raw_content_header = f"Full source content limited to {max_tokens_per_source} tokens:\n "
 
     # Format output
-    formatted_text = "Sources:\n\n"
-    for i, (url, source) in enumerate(unique_sources.items(), 1):
-        formatted_text += f"Source {i}:\n\n"
-        formatted_text += f'Title: {source["title"]}\n\n'
-        formatted_text += f"URL: {url}\n\n"
-        formatted_text += f"Most relevant content from source:\n{source['content']}\n==\n\n"
+    write("Sources:")
+    for i, (url, source) in enumerate(items, 1):
+        # One fragment per source header instead of one per line
+        write(f"\n\nSource {i}:\n\n"
+              f"Title: {source['title']}\n\n"
+              f"URL: {url}\n\n"
+              f"Most relevant content from source:\n{source['content']}\n==\n\n")
         if include_raw_content:
-            # Using rough estimate of 4 characters per token
-            char_limit = max_tokens_per_source * 4
-            # Handle None raw_content
-            raw_content = source.get('raw_content', '')
-            if raw_content is None:
-                raw_content = ''
-                # print(f"Warning: No raw_content found for source {source['url']}")
-            if len(raw_content) > char_limit:
-                raw_content = raw_content[:char_limit] + "... [truncated]"
-            formatted_text += f"Full source content limited to {max_tokens_per_source} tokens:\n {raw_content}\n\n"
+            write(raw_content_header)
+            if encoding is None:
+                # Handle None raw_content
+                raw_content = source.get('raw_content') or ''
+                is_truncated = len(raw_content) > char_limit
+                write(raw_content[:char_limit])
+            else:
+                raw_content, is_truncated = next(truncated_raw_contents)
+                write(raw_content)
+            write("... [truncated]\n\n" if is_truncated else "\n\n")
+
+        write('====================================')
+
+    return out.getvalue()
+
+
+@lru_cache(maxsize=4)
+def _get_token_encoding(name: str) -> "tiktoken.Encoding":
+    import tiktoken  # Installed with langchain-openai
+    return tiktoken.get_encoding(name)
+
+
+def _truncate_to_tokens(texts: list[str], encoding: "tiktoken.Encoding", max_tokens: int) -> list[tuple[str, bool]]:
+    # Returns each text cut to at most max_tokens tokens, and whether it was cut.
+    # Texts that fit even at one token per UTF-8 byte are not encoded. Of the others, only a prefix that usually
+    # holds more than max_tokens tokens is encoded, not the whole (often long) page. If it holds no more, its tokens
+    # do not tell where the text is cut (its last token may be cut itself), so the whole text is encoded.
+    truncated = [(text, False) for text in texts]
+    long_positions = [i for i, text in enumerate(texts) if len(text) * 4 > max_tokens]
+    prefixes = [texts[i][:max_tokens * _MAX_CHARS_PER_TOKEN] for i in long_positions]
+    token_lists = _encode_ordinary(texts=prefixes, encoding=encoding)
+    short_prefixes = [k for k, (i, prefix, tokens) in enumerate(zip(long_positions, prefixes, token_lists))
+                      if len(tokens) <= max_tokens and len(prefix) < len(texts[i])]
+    if short_prefixes:
+        full_token_lists = _encode_ordinary(texts=[texts[long_positions[k]] for k in short_prefixes], encoding=encoding)
+        for k, tokens in zip(short_prefixes, full_token_lists):
+            prefixes[k] = texts[long_positions[k]]
+            token_lists[k] = tokens
+    for i, prefix, tokens in zip(long_positions, prefixes, token_lists):
+        if len(tokens) > max_tokens:
+            truncated[i] = (encoding.decode(tokens[:max_tokens]), True)
+        else:
+            truncated[i] = (prefix, len(prefix) < len(texts[i]))
+    return truncated
 
-        formatted_text += '====================================\n\n'
 
-    return formatted_text.strip()
+def _encode_ordinary(texts: list[str], encoding: "tiktoken.Encoding") -> list[list[int]]:
+    if len(texts) >= _PARALLEL_ENCODE_MIN_TEXTS:
+        # tiktoken releases the GIL while encoding, so several pages are encoded in parallel threads
+        return encoding.encode_ordinary_batch(texts)
+    return [encoding.encode_ordinary(text) for text in texts]
 
 
 # Modified from: https://github.com/langchain-ai/report-mAIstro/report_masitro.py#L89
 def deduplicate_and_format_sources(search_response: list[dict],
                                    max_tokens_per_source: int = 5000,
-                                   include_raw_content: bool = True) -> str:
+                                   include_raw_content: bool = True,
+                                   out: StringIO | None = None,
+                                   token_encoding: str | None = None) -> str:
     """
     Takes either a single search response or list of responses from Tavily API and formats them.
     Limits the raw_content to approximately max_tokens_per_source.
@@ -317,15 +913,21 @@ def deduplicate_and_format_sources(search_response: list[dict],
             - A list of dicts, each containing search results
         max_tokens_per_source: int
         include_raw_content: Boolean
+        out: Optional buffer the text is written to (see format_sources)
+        token_encoding: Optional tiktoken encoding name for an exact token limit (see format_sources)
 
     Returns:
         str: Formatted string with deduplicated sources
     """
 
-    unique_sources = deduplicate_sources(search_response=search_response)
+    # Sources are deduplicated as they are formatted, in one pass and without an intermediate dict
+    unique_sources = _iter_unique_sources(seen=set(),
+                                          sources=chain.from_iterable(map(_response_results, search_response)))
     out_str = format_sources(unique_sources=unique_sources,
                              max_tokens_per_source=max_tokens_per_source,
-                             include_raw_content=include_raw_content)
+                             include_raw_content=include_raw_content,
+                             out=out,
+                             token_encoding=token_encoding)
     return out_str
 
 
@@ -335,7 +937,7 @@ def strip_thinking_tokens(text: str) -> str:
 
     Remove <think> and </think> tags and their content from the text.
 
-    Iteratively removes all occurrences of content enclosed in thinking tokens.
+    Removes all occurrences of content enclosed in thinking tokens, in a single pass over the text.
 
     Args:
         text (str): The text to process
@@ -343,8 +945,7 @@ def strip_thinking_tokens(text: str) -> str:
     Returns:
         str: The text with thinking tokens and their content removed
     """
-    while "<think>" in text and "</think>" in text:
-        start = text.find("<think>")
-        end = text.find("</think>") + len("</think>")
-        text = text[:start] + text[end:]
-    return text
+    if '<think>' not in text:
+        # Most model outputs contain no thinking tokens, and a substring check is cheaper than a regex search
+        return text
+    return _THINKING_TOKENS_PATTERN.sub('', text)
@@ -1,8 +1,27 @@
+import asyncio
+import importlib.util
+from itertools import islice
+import os
+from typing import Final
+
+import httpx
 from pydantic import SecretStr
 from tavily import AsyncTavilyClient
 
+from .cache import DiskCache
 from .enums import TavilySearchCategory, TavilySearchDepth
-from .utils import tavily_search_async, deduplicate_sources
+from .utils import TAVILY_MAX_IN_FLIGHT, tavily_search_async, deduplicate_sources
+
+# With the optional h2 package (pip install ai-common[http2]), the concurrent searches of a loop are multiplexed as
+# HTTP/2 streams over one connection instead of each opening its own TCP/TLS connection
+_HTTP2_AVAILABLE: Final = importlib.util.find_spec('h2') is not None
+
+
+def _new_http2_client() -> httpx.AsyncClient:
+    # Routes through the same TAVILY_HTTP_PROXY / TAVILY_HTTPS_PROXY settings as the Tavily client's own HTTP client
+    proxies = {'http://': os.getenv('TAVILY_HTTP_PROXY'), 'https://': os.getenv('TAVILY_HTTPS_PROXY')}
+    mounts = {scheme: httpx.AsyncHTTPTransport(proxy=proxy, http2=True) for scheme, proxy in proxies.items() if proxy}
+    return httpx.AsyncClient(http2=True, mounts=mounts or None)
 
 
 class WebSearch:
@@ -66,6 +85,18 @@ class WebSearch:
     Attributes:
         client (AsyncTavilyClient): The underlying Tavily API client used for search operations.
                                   Configured with the provided API key for authenticated requests.
+                                  It keeps a pooled HTTP client per event loop, so connections (and their
+                                  TLS sessions) are reused across searches; call aclose() (or use async with)
+                                  when done. Pass http_transport to share a connection pool with other
+                                  components: the Tavily client always gets a private HTTP client, since it
+                                  writes its API key header onto the client it is given.
+        max_concurrency (int): Maximum number of searches in flight at once (default 16), shared by the concurrent
+                               search() calls of an event loop.
+        requests_per_minute (int | None): Maximum rate of searches sent to Tavily, shared within the process
+                                          (default None, no limit). Set it to the plan's rate limit to avoid 429s.
+        search_cache (DiskCache | None): Persistent cache of search responses, so that reruns of the same searches
+                                         on the same day do not query Tavily again (default None).
+        cache_ttl (float | None): Seconds for which responses are reused within the process (default None).
     
     Note:
         This class requires a valid Tavily API key for operation. All search operations are
@@ -81,8 +112,74 @@ class WebSearch:
         The AsyncTavilyClient is designed to be thread-safe, but it's recommended to use
         this class within a single asyncio event loop context for optimal performance.
     """
-    def __init__(self, api_key: SecretStr):
-        self.client = AsyncTavilyClient(api_key=api_key.get_secret_value())
+    def __init__(self,
+                 api_key: SecretStr,
+                 http_transport: httpx.AsyncBaseTransport | None = None,
+                 max_concurrency: int = TAVILY_MAX_IN_FLIGHT,
+                 requests_per_minute: int | None = None,
+                 search_cache: DiskCache | None = None,
+                 cache_ttl: float | None = None):
+        self._api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.search_cache = search_cache
+        self.cache_ttl = cache_ttl
+        self._http_transport = http_transport
+        self._http_client: httpx.AsyncClient | None = None  # Private HTTP client given to the Tavily client, if any
+        self._client = self._new_client()
+        self._client_loop: asyncio.AbstractEventLoop | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._semaphore_loop: asyncio.AbstractEventLoop | None = None
+
+    def _new_client(self) -> AsyncTavilyClient:
+        # Without a transport or h2, the Tavily client opens its own HTTP/1.1 client
+        if self._http_transport is not None:
+            self._http_client = httpx.AsyncClient(transport=self._http_transport)
+        else:
+            self._http_client = _new_http2_client() if _HTTP2_AVAILABLE else None
+        return AsyncTavilyClient(api_key=self._api_key.get_secret_value(), client=self._http_client)
+
+    @property
+    def client(self) -> AsyncTavilyClient:
+        """
+        The Tavily client for the running event loop.
+
+        Pooled connections belong to the loop they were opened on, so a WebSearch used from successive event loops
+        (e.g. repeated asyncio.run calls) gets a fresh client of its own on a new loop, while all searches within a
+        loop share one pool. An injected http_transport is always used as is.
+        """
+        if self._http_transport is None:
+            loop = asyncio.get_running_loop()
+            if self._client_loop is None:
+                self._client_loop = loop
+            elif self._client_loop is not loop:
+                # The connections of the old loop cannot be closed from here; they are dropped with the client
+                self._client = self._new_client()
+                self._client_loop = loop
+        return self._client
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # One cap on the searches in flight across the concurrent search() calls of a loop (e.g. WebSearchNode's
+        # per-query searches). Like the client, it belongs to a loop, so a new loop gets a new one.
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def aclose(self) -> None:
+        # An injected http_transport is owned by the caller and is left open (closing the client would close it)
+        if self._http_transport is None and self._client_loop in (None, asyncio.get_running_loop()):
+            await self._client.close()
+            if self._http_client is not None:
+                # The Tavily client treats a client passed to it as external and leaves it open
+                await self._http_client.aclose()
+
+    async def __aenter__(self) -> "WebSearch":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.aclose()
 
     async def search(self,
                      search_queries: list[str],
@@ -93,9 +190,13 @@ class WebSearch:
                      max_results_per_query: int,
                      include_images: bool,
                      include_image_descriptions: bool,
-                     include_favicon: bool) -> dict:
+                     include_favicon: bool,
+                     max_unique_sources: int | None = None) -> dict:
+        # max_unique_sources keeps only the first unique sources, in query and rank order
 
-        search_docs = await tavily_search_async(
+        # The searches run concurrently, but their responses are merged in query order, so that the numbering of the
+        # sources (and the URL variant kept of a duplicate) does not depend on which search finishes first
+        search_responses = await tavily_search_async(
             client=self.client,
             search_queries=search_queries,
             search_category=search_category,
@@ -106,7 +207,13 @@ class WebSearch:
             include_images=include_images,
             include_image_descriptions=include_image_descriptions,
             include_favicon=include_favicon,
+            semaphore=self._get_semaphore(),
+            requests_per_minute=self.requests_per_minute,
+            search_cache=self.search_cache,
+            cache_ttl=self.cache_ttl,
         )
 
-        unique_sources = deduplicate_sources(search_response=search_docs)
+        unique_sources = deduplicate_sources(search_response=search_responses)
+        if max_unique_sources is not None:
+            unique_sources = dict(islice(unique_sources.items(), max_unique_sources))
         return unique_sources
@@ -0,0 +1,24 @@
+from ai_common import CfgBase
+
+
+class Configuration(CfgBase):
+    max_results: int | bool
+    search_depth: str
+
+
+def runnable(**configurable) -> dict:
+    return {'configurable': {'thread_id': 't', 'search_depth': 'basic', **configurable}}
+
+
+def test_from_runnable_returns_independent_copies():
+    first = Configuration.from_runnable(runnable(max_results=3))
+    first.search_depth = 'advanced'
+
+    second = Configuration.from_runnable(runnable(max_results=3))
+
+    assert second.search_depth == 'basic'
+
+
+def test_from_runnable_tells_equal_values_of_different_types_apart():
+    assert Configuration.from_runnable(runnable(max_results=1)).max_results is not True
+    assert Configuration.from_runnable(runnable(max_results=True)).max_results is True
@@ -0,0 +1,34 @@
+import asyncio
+
+from ai_common import DiskCache
+
+
+def test_disk_cache_round_trip(tmp_path):
+    path = tmp_path / 'cache.db'
+    cache = DiskCache(path=path)
+    key = DiskCache.make_key('model', 'topic', 'content')
+
+    assert cache.get(key) is None
+    assert cache.get(key, default='missing') == 'missing'
+    cache.set(key, {'summary': 'text', 'tokens': [1, 2]})
+    cache.close()
+
+    reopened = DiskCache(path=path)
+    assert reopened.get(key) == {'summary': 'text', 'tokens': [1, 2]}
+    reopened.clear()
+    assert reopened.get(key) is None
+
+
+def test_make_key_separates_parts():
+    assert DiskCache.make_key('ab', 'c') != DiskCache.make_key('a', 'bc')
+    assert DiskCache.make_key('a', 'b') == DiskCache.make_key('a', 'b')
+
+
+def test_disk_cache_async_round_trip(tmp_path):
+    cache = DiskCache(path=tmp_path / 'cache.db')
+
+    async def round_trip():
+        await cache.aset('key', ['value'])
+        return await cache.aget('key'), await cache.aget('other', default='missing')
+
+    assert asyncio.run(round_trip()) == (['value'], 'missing')
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from langchain_core.callbacks import get_usage_metadata_callback
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from pydantic import SecretStr
+
+from ai_common import LlmServers, ModelNames, close_cached_llms, get_llm, get_token_usage
+from ai_common import llm
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keeps connections alive between requests
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), OkHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/'
+    server.shutdown()
+    server.server_close()
+
+
+def groq_llm(**model_args):
+    return get_llm(model_name=ModelNames.GPT_OSS_20B, model_provider=LlmServers.GROQ, api_key=SecretStr('gsk-test'),
+                   model_args=model_args)
+
+
+def test_pooled_async_client_works_across_event_loops(server_url):
+    http_async_client = groq_llm().http_async_client
+
+    async def get() -> str:
+        return (await http_async_client.get(server_url)).text
+
+    # The connection kept alive by the first loop must not be reused by the second one
+    assert asyncio.run(get()) == 'ok'
+    assert asyncio.run(get()) == 'ok'
+    close_cached_llms()
+
+
+def test_close_cached_llms_leaves_caller_clients_open():
+    http_async_client = httpx.AsyncClient()
+    chat_model = groq_llm(http_async_client=http_async_client)
+
+    close_cached_llms()
+
+    assert chat_model.http_client.is_closed
+    assert chat_model.http_async_client is http_async_client
+    assert not http_async_client.is_closed
+
+
+@pytest.mark.parametrize('cache_setting', ['memory', 'disk'])
+def test_llm_cache_hits_cost_nothing(cache_setting, tmp_path, monkeypatch):
+    monkeypatch.setenv(llm.LLM_CACHE_ENV_VAR, 'memory' if cache_setting == 'memory' else str(tmp_path / 'llm.db'))
+    llm._get_llm_cache.cache_clear()
+    message = AIMessage(content='answer', response_metadata={'model_name': 'fake-model'},
+                        usage_metadata={'input_tokens': 100, 'output_tokens': 10, 'total_tokens': 110})
+    model = GenericFakeChatModel(messages=iter([message]), cache=llm._get_llm_cache())
+
+    with get_usage_metadata_callback() as cb:
+        assert model.invoke('question').text == 'answer'
+        assert asyncio.run(model.ainvoke('question')).text == 'answer'  # Served from the cache
+    llm._get_llm_cache.cache_clear()
+
+    assert get_token_usage(usage_metadata=cb.usage_metadata, model_name_alias='fake-model') == {'input_tokens': 100,
+                                                                                                  'output_tokens': 10}
@@ -10,3 +10,9 @@ def test_public_api():
 
     assert not unexpected, f"❌ Unexpected public names found: {unexpected}"
     assert not missing, f"❌ Missing expected public names: {missing}"
+
+
+def test_public_names_resolve():
+    # Every lazily exported name must import and resolve from its submodule
+    for name in ai_common.__all__:
+        assert getattr(ai_common, name) is not None, f"❌ Public name does not resolve: {name}"
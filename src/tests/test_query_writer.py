@@ -0,0 +1,80 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import SecretStr
+
+from ai_common import LlmServers, ModelNames, close_cached_llms
+from ai_common.components.query_writer import QueryWriter
+
+MODEL_NAME = 'fake-model'
+
+
+class FakeChatModel(BaseChatModel):
+    """Returns a fixed text, streamed in small chunks, with a fixed token usage"""
+    text: str
+    input_tokens: int
+    output_tokens: int
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake'
+
+    def _usage(self) -> dict[str, int]:
+        return {'input_tokens': self.input_tokens,
+                'output_tokens': self.output_tokens,
+                'total_tokens': self.input_tokens + self.output_tokens}
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        message = AIMessage(content=self.text, usage_metadata=self._usage(),
+                            response_metadata={'model_name': MODEL_NAME})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages: list[BaseMessage], stop=None, run_manager=None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        for i in range(0, len(self.text), 16):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=self.text[i:i + 16]))
+        yield ChatGenerationChunk(message=AIMessageChunk(content='', usage_metadata=self._usage(),
+                                                         response_metadata={'model_name': MODEL_NAME}))
+
+
+def query_writer(json_llm: BaseChatModel) -> QueryWriter:
+    writer = QueryWriter.__new__(QueryWriter)
+    writer.model_name = MODEL_NAME
+    writer.model_name_alias = MODEL_NAME
+    writer.json_llm = json_llm
+    return writer
+
+
+def test_stream_queries_counts_only_its_own_usage():
+    queries = [{'search_query': f'query {i}', 'aspect': 'aspect', 'rationale': 'rationale'} for i in range(3)]
+    writer = query_writer(FakeChatModel(text=json.dumps({'queries': queries}), input_tokens=7, output_tokens=3))
+    consumer_llm = FakeChatModel(text='summary', input_tokens=100, output_tokens=10)
+    token_usage = {'input_tokens': 0, 'output_tokens': 0}
+
+    async def consume() -> list[str]:
+        received = []
+        async for query in writer.stream_queries(topic='topic', number_of_queries=3, token_usage=token_usage):
+            received.append(query.search_query)
+            await consumer_llm.ainvoke('summarize')  # E.g. a summary started while the queries are streamed
+        return received
+
+    assert asyncio.run(consume()) == ['query 0', 'query 1', 'query 2']
+    assert token_usage == {'input_tokens': 7, 'output_tokens': 3}
+
+
+def test_query_writer_after_close_cached_llms():
+    model_params = {'model': ModelNames.GPT_OSS_20B, 'model_provider': LlmServers.GROQ,
+                    'api_key': SecretStr('gsk-test'), 'model_args': {'temperature': 0}}
+    first = QueryWriter(model_params=model_params, configuration_module_prefix='configuration').json_llm.bound
+    assert QueryWriter(model_params=model_params, configuration_module_prefix='configuration').json_llm.bound is first
+
+    close_cached_llms()
+    second = QueryWriter(model_params=model_params, configuration_module_prefix='configuration').json_llm.bound
+
+    assert second is not first
+    assert first.http_client.is_closed
+    assert not second.http_client.is_closed
@@ -0,0 +1,228 @@
+import asyncio
+import re
+from collections import OrderedDict
+
+import pytest
+
+from ai_common import (
+    DiskCache,
+    TavilySearchCategory,
+    TavilySearchDepth,
+    canonicalize_url,
+    deduplicate_and_format_sources,
+    deduplicate_sources,
+    deduplicate_sources_async,
+    tavily_search_async,
+    unique_urls,
+)
+from ai_common import utils
+
+SEARCH_ARGS = dict(search_category=TavilySearchCategory.GENERAL,
+                   search_depth=TavilySearchDepth.BASIC,
+                   chunks_per_source=1,
+                   number_of_days_back=7,
+                   max_results=3,
+                   include_images=False,
+                   include_image_descriptions=False,
+                   include_favicon=False)
+
+
+def source(url: str, content: str | None = None) -> dict:
+    return {'url': url, 'title': 'title', 'content': content if content is not None else f'content of {url}'}
+
+
+class FakeTavilyClient:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.queries = []
+
+    async def search(self, query: str, **kwargs) -> dict:
+        self.queries.append(query)
+        await asyncio.sleep(self.delay)
+        return {'query': query, 'results': [source(f'https://example.com/{query}')]}
+
+
+@pytest.fixture(autouse=True)
+def empty_search_cache(monkeypatch):
+    monkeypatch.setattr(utils, '_SEARCH_CACHE', OrderedDict())
+    monkeypatch.setattr(utils, '_PENDING_SEARCHES', {})
+
+
+def test_canonicalize_url():
+    assert canonicalize_url('https://Example.com/a/') == canonicalize_url('http://example.com/a')
+    assert canonicalize_url('https://example.com/a?utm_source=x&gclid=1#top') == canonicalize_url('https://example.com/a')
+    assert canonicalize_url('https://example.com/a?page=2') != canonicalize_url('https://example.com/a')
+    assert canonicalize_url('https://example.com/a') != canonicalize_url('https://example.com/b')
+
+
+def test_deduplicate_sources_keeps_first_variant():
+    first = source('https://a.com/x', content='first')
+    responses = [{'results': [first]},
+                 {'results': [source('http://A.com/x/?utm_source=z', content='second'), source('https://b.com')]}]
+
+    unique_sources = deduplicate_sources(responses)
+
+    assert list(unique_sources) == ['https://a.com/x', 'https://b.com']
+    assert unique_sources['https://a.com/x'] is first
+    assert unique_urls(responses) == ['https://a.com/x', 'https://b.com']
+
+
+def test_deduplicate_sources_drops_same_content_on_other_host():
+    responses = [[source('https://a.com/story', content='Same  article\ntext')],
+                 [source('https://mirror.org/story', content='Same article text')]]
+
+    assert list(deduplicate_sources(responses)) == ['https://a.com/story']
+
+
+def test_empty_content_is_never_a_duplicate():
+    responses = [[source('https://a.com', content=''),
+                  {'url': 'https://b.com', 'title': 'title', 'content': None},
+                  source('https://c.com', content='  \n '),
+                  source('https://d.com', content='')]]
+
+    assert list(deduplicate_sources(responses)) == ['https://a.com', 'https://b.com', 'https://c.com', 'https://d.com']
+
+
+def test_deduplicate_and_format_sources_matches_deduplicate_sources():
+    responses = [{'results': [source('https://a.com/x'), source('https://a.com/x/')]}]
+
+    formatted = deduplicate_and_format_sources(responses, include_raw_content=False)
+
+    assert formatted.count('Source ') == 1
+    assert 'URL: https://a.com/x\n' in formatted
+
+
+def test_deduplicate_sources_async_stops_at_max_sources():
+    async def responses():
+        yield {'results': [source('https://a.com'), source('https://b.com')]}
+        yield {'results': [source('https://c.com')]}
+        raise AssertionError('read past max_sources')
+
+    unique_sources = asyncio.run(deduplicate_sources_async(responses(), max_sources=3))
+
+    assert list(unique_sources) == ['https://a.com', 'https://b.com', 'https://c.com']
+
+
+def test_search_cache_is_off_by_default():
+    client = FakeTavilyClient()
+
+    async def search_twice():
+        await tavily_search_async(client, ['q'], **SEARCH_ARGS)
+        await tavily_search_async(client, ['q'], **SEARCH_ARGS)
+
+    asyncio.run(search_twice())
+    assert client.queries == ['q', 'q']
+
+
+def test_search_cache_ttl(monkeypatch):
+    client = FakeTavilyClient()
+    now = [1000.0]
+    monkeypatch.setattr(utils.time, 'monotonic', lambda: now[0])
+
+    async def search():
+        return await tavily_search_async(client, ['q'], **SEARCH_ARGS, cache_ttl=300)
+
+    first = asyncio.run(search())
+    first[0]['results'][0]['content'] = 'changed by the caller'
+    now[0] += 299
+    second = asyncio.run(search())
+    assert client.queries == ['q']
+    assert second[0]['results'][0]['content'] == 'content of https://example.com/q'
+
+    now[0] += 2
+    asyncio.run(search())
+    assert client.queries == ['q', 'q']
+
+
+def test_concurrent_identical_searches_share_one_request():
+    client = FakeTavilyClient(delay=0.01)
+
+    async def search_concurrently():
+        return await asyncio.gather(tavily_search_async(client, ['q'], **SEARCH_ARGS, cache_ttl=300),
+                                    tavily_search_async(client, [' Q '], **SEARCH_ARGS, cache_ttl=300))
+
+    first, second = asyncio.run(search_concurrently())
+    assert client.queries == ['q']
+    assert first[0]['results'] == second[0]['results']
+    assert first[0]['results'][0] is not second[0]['results'][0]
+
+
+def test_timed_out_search_is_empty_and_not_cached():
+    client = FakeTavilyClient(delay=1.0)
+
+    async def search():
+        return await tavily_search_async(client, ['q'], **SEARCH_ARGS, search_timeout=0.01, cache_ttl=300)
+
+    assert asyncio.run(search()) == [{'query': 'q', 'results': []}]
+    assert asyncio.run(search()) == [{'query': 'q', 'results': []}]
+    assert client.queries == ['q', 'q']
+
+
+def test_search_responses_persist_in_disk_cache(tmp_path):
+    client = FakeTavilyClient()
+    search_cache = DiskCache(path=tmp_path / 'cache.db', table='tavily')
+
+    first = asyncio.run(tavily_search_async(client, ['q'], **SEARCH_ARGS, search_cache=search_cache))
+    second = asyncio.run(tavily_search_async(client, ['q'], **SEARCH_ARGS, search_cache=search_cache))
+
+    assert client.queries == ['q']
+    assert first == second
+
+
+def test_rate_limiter_spacing(monkeypatch):
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(round(delay, 6))
+
+    monkeypatch.setattr(utils.time, 'monotonic', lambda: 100.0)
+    monkeypatch.setattr(utils.asyncio, 'sleep', fake_sleep)
+    rate_limiter = utils._RateLimiter(requests_per_minute=600)  # One request per 0.1s, with a burst of 10
+
+    async def acquire(times: int):
+        for _ in range(times):
+            await rate_limiter.acquire()
+
+    asyncio.run(acquire(13))
+    assert delays == [0.1, 0.2, 0.3]
+
+
+class WordEncoding:
+    """Stands in for a tiktoken encoding: every word, with the whitespace after it, is one token"""
+    def __init__(self):
+        self.vocabulary = []
+
+    def encode_ordinary(self, text: str) -> list[int]:
+        tokens = []
+        for word in re.findall(r'\S+\s*', text):
+            if word not in self.vocabulary:
+                self.vocabulary.append(word)
+            tokens.append(self.vocabulary.index(word))
+        return tokens
+
+    def encode_ordinary_batch(self, texts: list[str]) -> list[list[int]]:
+        return [self.encode_ordinary(text) for text in texts]
+
+    def decode(self, tokens: list[int]) -> str:
+        return ''.join(self.vocabulary[token] for token in tokens)
+
+
+def test_truncate_to_tokens_with_long_tokens():
+    # 40 characters per token, far more than the prefix that is encoded first allows for
+    texts = [' '.join(f'https://example.com/{i:04d}/{"x" * 14}' for i in range(100)), 'short text']
+
+    (truncated, was_cut), short = utils._truncate_to_tokens(texts=texts, encoding=WordEncoding(), max_tokens=10)
+
+    assert was_cut
+    assert len(truncated.split()) == 10
+    assert texts[0].startswith(truncated)
+    assert short == ('short text', False)
+
+
+def test_truncate_to_tokens_with_short_tokens():
+    text = 'word ' * 1000
+
+    (truncated, was_cut), = utils._truncate_to_tokens(texts=[text], encoding=WordEncoding(), max_tokens=10)
+
+    assert was_cut
+    assert truncated == 'word ' * 10
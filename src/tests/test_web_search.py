@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+import httpx
+from pydantic import SecretStr
+
+from ai_common import TavilySearchCategory, TavilySearchDepth, WebSearch
+
+SEARCH_ARGS = dict(search_category=TavilySearchCategory.GENERAL,
+                   search_depth=TavilySearchDepth.BASIC,
+                   chunks_per_source=1,
+                   number_of_days_back=7,
+                   max_results_per_query=3,
+                   include_images=False,
+                   include_image_descriptions=False,
+                   include_favicon=False)
+
+
+def search_response(query: str, urls: list[str]) -> httpx.Response:
+    results = [{'url': url, 'title': 'title', 'content': f'{query} {url}', 'raw_content': None, 'score': 1.0}
+               for url in urls]
+    return httpx.Response(200, json={'query': query, 'results': results})
+
+
+def test_shared_transport_does_not_leak_the_api_key():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.url.host != 'api.tavily.com':
+            return httpx.Response(200, json={})
+        query = json.loads(request.content)['query']
+        return search_response(query=query, urls=[f'https://example.com/{query}'])
+
+    transport = httpx.MockTransport(handler)
+
+    async def search_then_reuse_transport():
+        async with WebSearch(api_key=SecretStr('tvly-secret'), http_transport=transport) as web_search:
+            sources = await web_search.search(search_queries=['q'], **SEARCH_ARGS)
+        async with httpx.AsyncClient(transport=transport) as other_client:  # Still open after aclose
+            await other_client.get('https://other.example.org/')
+        return sources
+
+    sources = asyncio.run(search_then_reuse_transport())
+
+    assert list(sources) == ['https://example.com/q']
+    tavily_request, other_request = requests
+    assert tavily_request.headers['Authorization'] == 'Bearer tvly-secret'
+    assert 'Authorization' not in other_request.headers
+
+
+def test_search_merges_responses_in_query_order():
+    urls = {'slow': ['https://a.com/x', 'https://b.com'], 'fast': ['http://A.com/x/', 'https://c.com']}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        query = json.loads(request.content)['query']
+        await asyncio.sleep(0.05 if query == 'slow' else 0)
+        return search_response(query=query, urls=urls[query])
+
+    async def search(max_unique_sources: int | None = None):
+        async with WebSearch(api_key=SecretStr('tvly-secret'),
+                             http_transport=httpx.MockTransport(handler)) as web_search:
+            return await web_search.search(search_queries=['slow', 'fast'], max_unique_sources=max_unique_sources,
+                                           **SEARCH_ARGS)
+
+    assert list(asyncio.run(search())) == ['https://a.com/x', 'https://b.com', 'https://c.com']
+    assert list(asyncio.run(search(max_unique_sources=2))) == ['https://a.com/x', 'https://b.com']
+
+
+def test_max_concurrency_is_shared_by_concurrent_searches():
+    in_flight = [0, 0]  # Current and maximum number of requests in flight
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight)
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        query = json.loads(request.content)['query']
+        return search_response(query=query, urls=[f'https://example.com/{query}'])
+
+    async def search_concurrently():
+        async with WebSearch(api_key=SecretStr('tvly-secret'), http_transport=httpx.MockTransport(handler),
+                             max_concurrency=2) as web_search:
+            return await asyncio.gather(*[web_search.search(search_queries=[f'{i}a', f'{i}b'], **SEARCH_ARGS)
+                                          for i in range(3)])
+
+    assert [len(sources) for sources in asyncio.run(search_concurrently())] == [2, 2, 2]
+    assert in_flight[1] == 2
@@ -0,0 +1,94 @@
+import asyncio
+from types import SimpleNamespace
+
+from ai_common import DiskCache
+from ai_common.components.web_search_node import SourceSummaries, SourceSummary, WebSearchNode
+
+
+class CountingCache(DiskCache):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.gets = []
+
+    def get(self, key, default=None):
+        self.gets.append(key)
+        return super().get(key, default)
+
+
+class FakeBatchLlm:
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        n = messages[-1].content.count('<source index=')
+        return SourceSummaries(summaries=[SourceSummary(index=i, summary=f'summary {i}') for i in range(1, n + 1)])
+
+
+def web_search_node(summary_cache: DiskCache | None = None) -> WebSearchNode:
+    node = WebSearchNode.__new__(WebSearchNode)
+    node.model_name_alias = 'fake-model'
+    node.summary_cache = summary_cache
+    node.batch_summaries_llm = FakeBatchLlm()
+    return node
+
+
+def source(raw_content: str) -> dict:
+    return {'url': f'https://example.com/{raw_content}', 'title': 'title', 'content': 'content',
+            'raw_content': raw_content, 'score': 0.5}
+
+
+def test_summarize_sources_reads_each_cache_key_once(tmp_path):
+    summary_cache = CountingCache(path=tmp_path / 'cache.db')
+    node = web_search_node(summary_cache=summary_cache)
+    summary_cache.set(node._summary_cache_key(topic='topic', raw_content='b', chunk_chars=100, max_chunks=4),
+                      'cached b')
+
+    out = asyncio.run(node.summarize_sources(topic='topic', source_dicts=[source('a'), source('b'), source('c')],
+                                             chunk_chars=100))
+
+    assert [summary['content'] for summary in out] == ['summary 1', 'cached b', 'summary 2']
+    assert out[1]['token_usage'] == {'input_tokens': 0, 'output_tokens': 0}
+    assert len(summary_cache.gets) == len(set(summary_cache.gets)) == 3
+    assert node.batch_summaries_llm.calls == 1
+
+
+class FakeWebSearch:
+    def __init__(self, responses: dict[str, tuple[float, list[dict]]]):
+        self.responses = responses
+
+    async def search(self, search_queries: list[str], **kwargs) -> dict:
+        delay, sources = self.responses[search_queries[0]]
+        await asyncio.sleep(delay)
+        return {source['url']: dict(source) for source in sources}
+
+
+def test_kept_source_gets_the_summary_of_its_own_content():
+    node = web_search_node()
+    node.model_name = 'fake-model'
+    node.web_search = FakeWebSearch({'slow': (0.05, [source('first variant') | {'url': 'https://a.com/x'}]),
+                                     'fast': (0.0, [source('second variant') | {'url': 'http://A.com/x/'}])})
+
+    async def summarize_source(topic, source_dict, **kwargs):
+        return {'content': f"summary of {source_dict['raw_content']}",
+                'token_usage': {'input_tokens': 1, 'output_tokens': 1}}
+
+    node.summarize_source = summarize_source
+    state = SimpleNamespace(steps=[], token_usage={})
+
+    async def run():
+        summaries = {}
+        search_tasks = [asyncio.create_task(node._search_and_summarize(query=query, topic='topic', search_kwargs={},
+                                                                       summarize_kwargs={}, batch_size=1,
+                                                                       summaries=summaries))
+                        for query in ('slow', 'fast')]
+        return await node._collect_summaries(state=state, configurable=SimpleNamespace(max_tokens_per_source=100),
+                                             search_tasks=search_tasks, summaries=summaries, started=0.0)
+
+    state = asyncio.run(run())
+
+    assert list(state.unique_sources) == ['https://a.com/x']
+    assert state.unique_sources['https://a.com/x'] == {'title': 'title', 'content': 'summary of first variant',
+                                                       'score': 0.5}
+    # The summary of the other variant was made as well, and its tokens count too
+    assert state.token_usage == {'fake-model': {'input_tokens': 2, 'output_tokens': 2}}